@@ -0,0 +1,77 @@
+"""Compare walking a precomputed decision tree with on-the-fly greedy selection.
+
+Usage: python benchmarks/bench_decision_tree.py [series] [difficulty] [boards]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'character'))
+
+from characterManager import CharacterManager
+from decisionTree import DecisionTreeCache, build_tree
+from gameBoard import RoundState
+from questionSelector import best_question
+
+
+def play_greedy(board, secret):
+    game = RoundState(board, secret)
+    while True:
+        question = best_question(board, game.candidates)
+        if question is None:
+            return game.questions_asked
+        game.ask(question)
+
+
+def play_tree(tree, board, secret):
+    walker = tree.walk()
+    asked = 0
+    while True:
+        question = walker.question
+        if question is None:
+            return asked
+        walker.answer(board.answer(question, secret))
+        asked += 1
+
+
+def main():
+    series = sys.argv[1] if len(sys.argv) > 1 else 'attackontitan'
+    difficulty = sys.argv[2] if len(sys.argv) > 2 else 'expert'
+    board_count = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    manager = CharacterManager()
+    boards = [manager.create_board(difficulty, series, seed=seed) for seed in range(board_count)]
+    games = [(board, secret) for board in boards for secret in range(board.size)]
+
+    start = time.perf_counter()
+    trees = [build_tree(board.characters) for board in boards]
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    greedy_questions = sum(play_greedy(board, secret) for board, secret in games)
+    greedy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tree_questions = sum(play_tree(tree, board, secret)
+                         for tree, board in zip(trees, boards) for secret in range(board.size))
+    tree_time = time.perf_counter() - start
+
+    cache = DecisionTreeCache()
+    for board in boards:
+        cache.get(board)
+    start = time.perf_counter()
+    for board in boards:
+        cache.get(board)
+    lookup_time = time.perf_counter() - start
+
+    print(f"{len(boards)} {difficulty} boards from {series}, {len(games)} games")
+    print(f"Tree build (offline): {build_time * 1000:.1f} ms total")
+    print(f"Cache hit lookup:     {lookup_time / len(boards) * 1e6:.1f} us per board")
+    print(f"Greedy selection:     {greedy_time / len(games) * 1e6:.1f} us per game, "
+          f"{greedy_questions / len(games):.2f} questions on average")
+    print(f"Tree walk:            {tree_time / len(games) * 1e6:.1f} us per game, "
+          f"{tree_questions / len(games):.2f} questions on average")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Benchmark CharacterManager on synthetic rosters and write the results as JSON.
+
+Every roster size runs in a fresh process so that cold load time and peak RSS
+are not affected by earlier runs.
+
+Usage: python benchmarks/bench_manager.py [--sizes 1000,10000,100000] [--output results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from typing import Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'character'))
+sys.path.insert(0, BENCH_DIR)
+
+RESULTS_VERSION = 1
+SERIES_FILE = 'attackontitan.json'
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+def time_calls(function: Callable, arguments: List) -> Dict[str, float]:
+    """Latency statistics of calling `function` once per argument"""
+    timings = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(argument)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'calls': len(timings),
+        'mean_us': sum(timings) / len(timings) * 1e6,
+        'p50_us': timings[len(timings) // 2] * 1e6,
+        'p95_us': timings[int(len(timings) * 0.95)] * 1e6,
+    }
+
+
+def run_child(data_dir: str, use_snapshots: bool, output: str):
+    """Measure one roster inside this (fresh) process"""
+    from characterManager import CharacterManager
+
+    class BenchmarkManager(CharacterManager):
+        _instance = None
+        DATA_DIR = data_dir
+        SERIES_FILES = [SERIES_FILE]
+
+    BenchmarkManager.use_snapshots = use_snapshots
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        manager = BenchmarkManager()
+    load_time = time.perf_counter() - start
+
+    characters = manager.get_all_characters()
+    rng = random.Random(0)
+    sample = rng.sample(characters, min(1000, len(characters)))
+    ids = [c.id for c in sample]
+    names = [c.name for c in sample]
+    prefixes = [name.split()[0][:3] for name in names[:200]]
+    filters = [dict(status=c.status, hair_color=c.hair_color, eye_color=c.eye_color) for c in sample[:200]]
+    manager.board_sampler()   # built once per loaded data, not per call
+
+    operations = {
+        'get_character_by_id': time_calls(manager.get_character_by_id, ids),
+        'get_character_by_name': time_calls(manager.get_character_by_name, names),
+        'search_characters': time_calls(lambda q: manager.search_characters(q, limit=20), prefixes),
+        'filter_characters': time_calls(lambda f: manager.filter_characters(**f), filters),
+        # Batches of 100 hard boards
+        'generate_boards': time_calls(lambda seed: manager.generate_boards('hard', 100, seed=seed), range(20)),
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'characters': len(characters),
+            'load_s': load_time,
+            'operations': operations,
+            'peak_rss_mb': peak_rss_mb(),
+        }, f)
+
+
+def measure(data_dir: str, use_snapshots: bool) -> Dict:
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        output = f.name
+    try:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--child', data_dir,
+                        '--snapshots' if use_snapshots else '--no-snapshots', '--output', output],
+                       check=True)
+        with open(output, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    finally:
+        os.unlink(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='comma separated roster sizes (e.g. 1000,10000,100000,1000000)')
+    parser.add_argument('--output', default='bench_results.json', help='where to write the JSON results')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--child', metavar='DATA_DIR', help=argparse.SUPPRESS)
+    parser.add_argument('--snapshots', dest='snapshots', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--no-snapshots', dest='snapshots', action='store_false', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.snapshots, args.output)
+        return
+
+    from generate_roster import RosterModel, generate_roster
+
+    model = RosterModel()
+    results = []
+    for size in (int(s) for s in args.sizes.split(',')):
+        with tempfile.TemporaryDirectory() as data_dir:
+            print(f"Generating {size} characters...")
+            generate_roster(size, os.path.join(data_dir, SERIES_FILE), args.seed, model)
+            # JSON parse first (it also writes the snapshot), then the snapshot load
+            cold = measure(data_dir, use_snapshots=True)
+            warm = measure(data_dir, use_snapshots=True)
+        result = {
+            'size': size,
+            'cold_load_s': cold['load_s'],
+            'snapshot_load_s': warm['load_s'],
+            'peak_rss_mb': cold['peak_rss_mb'],
+            'operations': cold['operations'],
+        }
+        results.append(result)
+        print(f"{size:>9} characters: cold load {result['cold_load_s']:.2f}s, "
+              f"snapshot load {result['snapshot_load_s']:.2f}s, peak RSS {result['peak_rss_mb']:.0f} MB")
+        for name, stats in result['operations'].items():
+            print(f"{'':>11}{name:<24} mean {stats['mean_us']:9.1f} us   p95 {stats['p95_us']:9.1f} us")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': RESULTS_VERSION,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'results': results,
+        }, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Compare the memory used by slotted, interned characters with plain dataclasses.
+
+Usage: python benchmarks/bench_memory.py [series JSON file] [characters]
+"""
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from dataclasses import field, fields, make_dataclass
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'character'))
+
+from characterFactory import CharacterFactory
+
+DEFAULT_FILE = os.path.join(ROOT, 'practica4', 'assets', 'data', 'attackontitan.json')
+
+_dict_twins = {}
+
+
+def dict_twin(cls):
+    """Same fields as a model class, but with a per-instance __dict__"""
+    twin = _dict_twins.get(cls)
+    if twin is None:
+        spec = [(f.name, f.type, field(default=f.default)) for f in fields(cls) if f.init]
+        twin = _dict_twins[cls] = make_dataclass(cls.__name__ + 'Dict', spec)
+    return twin
+
+
+def measure(raw: str, series: str, copies: int, slotted: bool) -> int:
+    """Bytes retained by the characters once the parsed JSON is released"""
+    CharacterFactory.intern_values = slotted
+    gc.collect()
+    tracemalloc.start()
+    characters = []
+    for _ in range(copies):
+        # Parse again for every copy so that strings are not shared, as with distinct rosters
+        for char_data in json.loads(raw)['body']:
+            character = CharacterFactory.create_character(char_data, series)
+            if not slotted:
+                twin = dict_twin(type(character))
+                character = twin(**{f.name: getattr(character, f.name) for f in fields(twin)})
+            characters.append(character)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del characters
+    return retained
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_FILE
+    target = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    series = os.path.splitext(os.path.basename(path))[0]
+
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = f.read()
+    per_copy = len(json.loads(raw)['body'])
+    copies = max(1, target // per_copy)
+    count = copies * per_copy
+
+    plain = measure(raw, series, copies, slotted=False)
+    compact = measure(raw, series, copies, slotted=True)
+    CharacterFactory.intern_values = True
+
+    print(f"{count} {series} characters")
+    print(f"Plain dataclasses:           {plain / count:8.0f} bytes per character")
+    print(f"Slots + interned categories: {compact / count:8.0f} bytes per character")
+    print(f"Saved: {(1 - compact / plain) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
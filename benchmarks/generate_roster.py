@@ -0,0 +1,91 @@
+"""Generate synthetic character rosters shaped like the real series files.
+
+Field values are drawn from the distributions found in attackontitan.json, so
+categorical fields repeat like real data and text fields have realistic sizes.
+
+Usage: python benchmarks/generate_roster.py <characters> <output file> [seed]
+"""
+import json
+import os
+import random
+import sys
+from collections import Counter
+from typing import Dict, List, Optional
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+TEMPLATE_FILE = os.path.join(ROOT, 'practica4', 'assets', 'data', 'attackontitan.json')
+
+NUMERIC_FIELDS = ('age', 'titanKillCount', 'humanKillCount')
+
+
+class RosterModel:
+    """Empirical distribution of every field of a template series file"""
+
+    def __init__(self, template_path: str = TEMPLATE_FILE):
+        with open(template_path, 'r', encoding='utf-8') as f:
+            body = [c for c in json.load(f)['body'] if c]
+
+        self.scalars: Dict[str, Counter] = {}
+        self.lists: Dict[str, List[List]] = {}
+        self.first_names: List[str] = []
+        self.last_names: List[str] = []
+        for character in body:
+            first, _, last = character['name'].partition(' ')
+            self.first_names.append(first)
+            self.last_names.append(last or first)
+            for key, value in character.items():
+                if key in ('id', 'name'):
+                    continue
+                if isinstance(value, list):
+                    self.lists.setdefault(key, []).append(value)
+                else:
+                    self.scalars.setdefault(key, Counter())[json.dumps(value)] += 1
+        self.list_items = {key: [item for values in lists for item in values]
+                           for key, lists in self.lists.items()}
+        self.choices = {key: tuple(zip(*counter.items())) for key, counter in self.scalars.items()}
+
+    def character(self, char_id: int, rng: random.Random) -> Dict:
+        character = {
+            'id': char_id,
+            'name': f"{rng.choice(self.first_names)} {rng.choice(self.last_names)} {char_id}",
+        }
+        for key, (values, weights) in self.choices.items():
+            character[key] = json.loads(rng.choices(values, weights)[0])
+        for key, lists in self.lists.items():
+            length = len(rng.choice(lists))
+            character[key] = rng.sample(self.list_items[key], min(length, len(self.list_items[key])))
+        for key in NUMERIC_FIELDS:
+            if isinstance(character.get(key), int):
+                character[key] = max(0, character[key] + rng.randint(-5, 5))
+        if isinstance(character.get('height'), str):
+            character['height'] = f"{rng.randint(140, 210)} cm"
+        if isinstance(character.get('weight'), str):
+            character['weight'] = f"{rng.randint(40, 110)} kg"
+        return character
+
+
+def generate_roster(count: int, path: str, seed: int = 0, model: Optional[RosterModel] = None):
+    """Write `count` characters to `path` in the {"status": 200, "body": [...]} shape"""
+    model = model or RosterModel()
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"status": 200, "body": [\n')
+        for char_id in range(1, count + 1):
+            if char_id > 1:
+                f.write(',\n')
+            f.write(json.dumps(model.character(char_id, rng), ensure_ascii=False))
+        f.write('\n]}\n')
+
+
+def main():
+    if len(sys.argv) < 3:
+        print(__doc__)
+        return
+    count = int(sys.argv[1])
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    generate_roster(count, sys.argv[2], seed)
+    print(f"Wrote {count} characters to {sys.argv[2]}")
+
+
+if __name__ == "__main__":
+    main()
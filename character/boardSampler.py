@@ -0,0 +1,169 @@
+import heapq
+import random
+from collections import Counter
+from itertools import chain
+from math import ceil, log2
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from characterIndex import iter_indexable_values, iter_numeric_values
+from characterModels import Character
+from characterNumbers import Number
+from gameBoard import DIFFICULTY_SIZES, NON_QUESTION_FIELDS, Board, Question
+from questionSelector import split_entropy
+
+# Boards scoring lower are redrawn (see BoardSampler.score)
+MIN_BOARD_SCORE = 0.8
+# Draws per requested board before giving up on the minimum score
+MAX_ATTEMPTS = 200
+
+
+class BoardSampler:
+    """Draws Guess Who boards that are worth playing, from a fixed pool of characters.
+
+    Every character is reduced once to a signature: the ids of the
+    (field, value) questions it answers "yes" to. Numeric fields are indexed
+    by their raw values too, so characters with the same signature also have
+    the same numbers and not even a threshold question tells them apart; the
+    pool is grouped by signature and a board takes at most one character of
+    a group. The parsed numbers are kept aside to score threshold questions. Boards are scored from the signatures alone and redrawn while
+    below the minimum score, and the accepted ones get their answer masks
+    from the signatures too instead of indexing their characters again.
+    """
+
+    def __init__(self, characters: Sequence[Character]):
+        self.characters: Tuple[Character, ...] = tuple(characters)
+        fields: Dict[str, int] = {}
+        features: Dict[Tuple[str, object], int] = {}
+        self._questions: List[Question] = []
+        self._feature_fields: List[int] = []
+        self._signatures: List[Tuple[int, ...]] = []
+        self._numbers: List[Tuple[Tuple[int, Number], ...]] = []
+        groups: Dict[Tuple[int, ...], List[int]] = {}
+        for position, character in enumerate(self.characters):
+            signature = set()
+            for field_name, value in iter_indexable_values(character):
+                if field_name in NON_QUESTION_FIELDS:
+                    continue
+                feature = features.get((field_name, value))
+                if feature is None:
+                    feature = features[(field_name, value)] = len(self._questions)
+                    self._questions.append(Question(field_name, value))
+                    self._feature_fields.append(fields.setdefault(field_name, len(fields)))
+                signature.add(feature)
+            signature = tuple(sorted(signature))
+            self._signatures.append(signature)
+            self._numbers.append(tuple((fields.setdefault(field_name, len(fields)), number)
+                                       for field_name, number in iter_numeric_values(character)))
+            groups.setdefault(signature, []).append(position)
+        self._groups: List[Tuple[int, ...]] = [tuple(group) for group in groups.values()]
+        self._field_names: List[str] = list(fields)
+
+    @property
+    def distinct(self) -> int:
+        """Number of characters that can be told apart, the largest possible board"""
+        return len(self._groups)
+
+    def score(self, members: Sequence[int]) -> float:
+        """How playable a board is, from 0 to 1: its balance times its coverage.
+
+        Balance: for every field the best split of the board (equality or
+        threshold question) is worth its information gain in bits, and the
+        balance is the mean gain of the best log2(size) fields, 1 when that
+        many different fields each have a question halving the board.
+        Coverage: the share of the board that real questions, with at least
+        two characters on each side, tell apart; what is left can only be
+        singled out by questions about one character's unique trait.
+        """
+        size = len(members)
+        signatures = [self._signatures[member] for member in members]
+        best: Dict[int, float] = {}
+        shared = set()
+        feature_fields = self._feature_fields
+        for feature, yes in Counter(chain.from_iterable(signatures)).items():
+            if yes < size:
+                gain = split_entropy(yes, size)
+                field = feature_fields[feature]
+                if gain > best.get(field, 0.0):
+                    best[field] = gain
+                if 2 <= yes <= size - 2:
+                    shared.add(feature)
+
+        profiles = [[tuple(f for f in signature if f in shared)] for signature in signatures]
+        columns: Dict[int, List[Tuple[Number, int]]] = {}
+        for i, member in enumerate(members):
+            for field, number in self._numbers[member]:
+                columns.setdefault(field, []).append((number, i))
+        for field, column in columns.items():
+            column.sort()
+            # Members between the same two shared thresholds get the same interval
+            interval = 0
+            for i, (number, member) in enumerate(column):
+                if i and number != column[i - 1][0]:
+                    yes = len(column) - i
+                    gain = split_entropy(yes, size)
+                    if gain > best.get(field, 0.0):
+                        best[field] = gain
+                    if 2 <= yes <= size - 2:
+                        interval += 1
+                profiles[member].append((field, interval))
+
+        k = max(1, ceil(log2(size)))
+        balance = sum(heapq.nlargest(k, best.values())) / k
+        coverage = len(set(map(tuple, profiles))) / size
+        return balance * coverage
+
+    def _draw(self, size: int, rng: random.Random) -> List[int]:
+        groups = self._groups
+        return [group[0] if len(group) == 1 else rng.choice(group)
+                for group in map(groups.__getitem__, rng.sample(range(len(groups)), size))]
+
+    def board(self, members: Sequence[int]) -> Board:
+        """Board of the characters at the given pool positions, in that order"""
+        size = len(members)
+        full_mask = (1 << size) - 1
+        masks: Dict[int, int] = {}
+        columns: Dict[int, List[Tuple[Number, int]]] = {}
+        for position, member in enumerate(members):
+            bit = 1 << position
+            for feature in self._signatures[member]:
+                masks[feature] = masks.get(feature, 0) | bit
+            for field, number in self._numbers[member]:
+                columns.setdefault(field, []).append((number, position))
+        questions = self._questions
+        answer_masks = {questions[feature]: mask for feature, mask in masks.items() if mask != full_mask}
+        for field, column in columns.items():
+            column.sort()
+            field_name = self._field_names[field]
+            # Walk down from the largest value: the mask of "> threshold"
+            # grows by one character at a time
+            above = 0
+            for i in range(len(column) - 1, 0, -1):
+                above |= 1 << column[i][1]
+                if column[i - 1][0] != column[i][0]:
+                    answer_masks[Question(field_name, column[i - 1][0], '>')] = above
+        characters = self.characters
+        return Board([characters[member] for member in members], answer_masks)
+
+    def sample(self, difficulty: str = 'hard', count: int = 1, rng: Optional[random.Random] = None,
+               min_score: float = MIN_BOARD_SCORE) -> List[Board]:
+        """Draw `count` boards of pairwise distinguishable characters scoring at least `min_score`.
+
+        Raises ValueError if the pool has too few distinguishable characters
+        for the difficulty, or if no board reaches the score in MAX_ATTEMPTS
+        draws.
+        """
+        size = DIFFICULTY_SIZES[difficulty]
+        if self.distinct < size:
+            raise ValueError(f"Need {size} distinguishable characters for a {difficulty} board, "
+                             f"got {self.distinct}")
+        rng = rng or random
+        boards = []
+        for _ in range(count):
+            for _ in range(MAX_ATTEMPTS):
+                members = self._draw(size, rng)
+                if self.score(members) >= min_score:
+                    break
+            else:
+                raise ValueError(f"No {difficulty} board scored {min_score} or more in {MAX_ATTEMPTS} draws")
+            boards.append(self.board(members))
+        return boards
@@ -1,115 +1,258 @@
+import sys
+from dataclasses import MISSING, dataclass, fields
 from characterModels import Character, OnePieceCharacter, NarutoCharacter, DemonSlayerCharacter, AttackOnTitanCharacter
-from typing import Dict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type, Union
 
-class CharacterFactory:
-    """Factory class to create appropriate character types"""
-    
-    @staticmethod
-    def create_character(char_data: Dict, series: str) -> Character:
-        """Create a character object based on the series"""
-        
-        # Common fields mapping
-        common_fields = {
-            'id': char_data.get('id'),
-            'name': char_data.get('name'),
-            'status': char_data.get('status'),
-            'appearance': char_data.get('appearance'),
-            'personality': char_data.get('personality'),
-            'background': char_data.get('background'),
-            'allies': char_data.get('allies'),
-            'enemies': char_data.get('enemies'),
-            'voice_actors': char_data.get('voiceActors') or char_data.get('voice_actor'),
-            'quotes': char_data.get('quotes') or char_data.get('notableQuotes'),
-            'first_appearance': char_data.get('first_appearance') or char_data.get('firstAppearance'),
-            'series': series
-        }
-        
-        if series.lower() == 'onepiece':
-            return OnePieceCharacter(
-                **common_fields,
-                epithet=char_data.get('epithet'),
-                crew=char_data.get('crew'),
-                position=char_data.get('position'),
-                origin=char_data.get('origin'),
-                hometown=char_data.get('hometown'),
-                devil_fruit=char_data.get('devilFruit'),
-                bounty=char_data.get('bounty'),
-                age=char_data.get('age'),
-                birthday=char_data.get('birthday'),
-                height=char_data.get('height'),
-                blood_type=char_data.get('bloodType'),
-                fighting_style=char_data.get('fighting_style'),
-                haki=char_data.get('haki'),
-                techniques=char_data.get('techniques'),
-                family=char_data.get('family'),
-                dream=char_data.get('dream'),
-                weapons=char_data.get('weapons'),
-                achievements=char_data.get('achievements'),
-                hobbies=char_data.get('hobbies'),
-                weaknesses=char_data.get('weaknesses'),
-                laugh=char_data.get('laugh')
-            )
-        
-        elif series.lower() == 'naruto':
-            return NarutoCharacter(
-                **common_fields,
-                village=char_data.get('village'),
-                rank=char_data.get('rank'),
-                clan=char_data.get('clan'),
-                jutsu=char_data.get('jutsu'),
-                affiliation=char_data.get('affiliation'),
-                kekkei_genkai=char_data.get('kekkeiGenkai'),
-                nature_type=char_data.get('natureType'),
-                family=char_data.get('family'),
-                missions_completed=char_data.get('missions_completed'),
-                mentor=char_data.get('mentor'),
-                students=char_data.get('students'),
-                weapons=char_data.get('weapons'),
-                summonings=char_data.get('summonings'),
-                achievements=char_data.get('achievements'),
-                hobbies=char_data.get('hobbies'),
-                transformations=char_data.get('transformations'),
-                goals=char_data.get('goals'),
-                theme_song=char_data.get('theme_song')
-            )
-        
-        elif series.lower() == 'demonslayer':
-            return DemonSlayerCharacter(
-                **common_fields,
-                role=char_data.get('role'),
-                affiliation=char_data.get('affiliation'),
-                breath_style=char_data.get('breathStyle'),
-                techniques=char_data.get('techniques'),
-                family=char_data.get('family'),
-                achievements=char_data.get('achievements'),
-                goals=char_data.get('goals'),
-                mentor=char_data.get('mentor')
-            )
-        
-        elif series.lower() == 'attackontitan':
-            return AttackOnTitanCharacter(
-                **common_fields,
-                age=char_data.get('age'),
-                height=char_data.get('height'),
-                weight=char_data.get('weight'),
-                hair_color=char_data.get('hairColor'),
-                eye_color=char_data.get('eyeColor'),
-                birthplace=char_data.get('birthplace'),
-                skills=char_data.get('skills'),
-                titan_form=char_data.get('titanForm'),
-                notable_battles=char_data.get('notableBattles'),
-                love_interests=char_data.get('loveInterests'),
-                fears=char_data.get('fears'),
-                hobbies=char_data.get('hobbies'),
-                dislikes=char_data.get('dislikes'),
-                education=char_data.get('education'),
-                affiliations=char_data.get('affiliations'),
-                trivia=char_data.get('trivia'),
-                injuries_and_scars=char_data.get('injuriesAndScars'),
-                titan_kill_count=char_data.get('titanKillCount'),
-                human_kill_count=char_data.get('humanKillCount'),
-                character_arc=char_data.get('characterArc')
-            )
-        
+
+@dataclass(frozen=True)
+class Field:
+    """Where a model attribute is read from: the first truthy of `keys`.
+
+    Categorical values (status, hair color, crew...) repeat across characters
+    and have their strings interned.
+    """
+    keys: Tuple[str, ...]
+    category: bool = False
+
+
+def categorical(*keys: str) -> Field:
+    return Field(keys, category=True)
+
+
+FieldSource = Union[str, Tuple[str, ...], Field]
+
+# Fields shared by every series, keyed by model attribute
+COMMON_FIELDS: Dict[str, FieldSource] = {
+    'id': 'id',
+    'name': 'name',
+    'status': categorical('status'),
+    'appearance': 'appearance',
+    'personality': 'personality',
+    'background': 'background',
+    'allies': categorical('allies'),
+    'enemies': categorical('enemies'),
+    'voice_actors': ('voiceActors', 'voice_actor'),
+    'quotes': ('quotes', 'notableQuotes'),
+    'first_appearance': ('first_appearance', 'firstAppearance'),
+}
+
+
+def _as_field(source: FieldSource) -> Field:
+    if isinstance(source, Field):
+        return source
+    if isinstance(source, str):
+        return Field((source,))
+    return Field(tuple(source))
+
+
+def _compile(model: Type[Character], mapping: Dict[str, Field], intern: bool) -> Callable[[Dict, str], Character]:
+    """Generate `build(char_data, series)` for a model and its field mapping.
+
+    The generated function fills the slots of a new instance directly, which
+    is about twice as fast as calling the dataclass __init__ with 30 arguments
+    (frozen models are still built through __init__).
+    """
+    namespace: Dict[str, Any] = {'_model': model, '_new': object.__new__, '_intern': sys.intern}
+    lines = ['def build(char_data, series):', '    get = char_data.get']
+    values = []
+    for number, model_field in enumerate(fields(model)):
+        name = f"v{number}"
+        source = mapping.get(model_field.name)
+        if model_field.name == 'series':
+            value = 'series'
+        elif source is not None:
+            lines.append(f"    {name} = " + ' or '.join(f"get({key!r})" for key in source.keys))
+            if intern and source.category:
+                lines += [
+                    f"    if type({name}) is str: {name} = _intern({name})",
+                    f"    elif type({name}) is list: "
+                    f"{name} = [_intern(x) if type(x) is str else x for x in {name}]",
+                ]
+            value = name
+        elif model_field.default is not MISSING:
+            namespace[f"_default{number}"] = model_field.default
+            value = f"_default{number}"
+        elif model_field.default_factory is not MISSING:
+            namespace[f"_factory{number}"] = model_field.default_factory
+            value = f"_factory{number}()"
         else:
+            value = 'None'
+        values.append((model_field, value))
+
+    if model.__dataclass_params__.frozen:
+        lines.append(f"    return _model({', '.join(value for f, value in values if f.init)})")
+    else:
+        lines.append('    character = _new(_model)')
+        lines += [f"    character.{f.name} = {value}" for f, value in values]
+        if hasattr(model, '__post_init__'):
+            lines.append('    character.__post_init__()')
+        lines.append('    return character')
+    exec(compile('\n'.join(lines), f"<{model.__name__} builder>", 'exec'), namespace)
+    return namespace['build']
+
+
+class CharacterFactory:
+    """Factory class to create appropriate character types.
+
+    Every series registers its model class and a field mapping; the mapping
+    is compiled on first use into a function that reads each JSON key once
+    and builds the character without going through keyword arguments.
+    """
+
+    # Share one copy of repeated categorical strings between all characters
+    intern_values = True
+
+    _series: Dict[str, Tuple[Type[Character], Dict[str, Field]]] = {}
+    _builders: Dict[Tuple[str, bool], Callable[[Dict, str], Character]] = {}
+
+    @classmethod
+    def register_series(cls, series: str, model: Type[Character], mapping: Dict[str, FieldSource]):
+        """Register (or replace) the model and JSON field mapping of a series.
+
+        `mapping` maps model attributes to a JSON key, a tuple of fallback
+        keys, or a Field; the common fields are included automatically and
+        model attributes left out keep their default.
+        """
+        known = {f.name for f in fields(model) if f.init}
+        combined = {name: _as_field(source) for name, source in {**COMMON_FIELDS, **mapping}.items()}
+        unknown = set(combined) - known
+        if unknown:
+            raise ValueError(f"{model.__name__} has no fields {sorted(unknown)}")
+        key = series.lower()
+        cls._series[key] = (model, combined)
+        cls._builders.clear()
+
+    @classmethod
+    def registered_series(cls) -> List[str]:
+        return list(cls._series)
+
+    @classmethod
+    def schema(cls, series: str) -> Tuple[Type[Character], Dict[str, str]]:
+        """Model class of a series and the model attribute read from each JSON key"""
+        key = series.lower()
+        if key not in cls._series:
             raise ValueError(f"Unknown series: {series}")
+        model, mapping = cls._series[key]
+        return model, {json_key: name for name, source in mapping.items() for json_key in source.keys}
+
+    @classmethod
+    def _builder(cls, series: str) -> Callable[[Dict, str], Character]:
+        intern = cls.intern_values
+        builder = cls._builders.get((series, intern))
+        if builder is None:
+            key = series.lower()
+            if key not in cls._series:
+                raise ValueError(f"Unknown series: {series}")
+            builder = cls._builders.get((key, intern))
+            if builder is None:
+                model, mapping = cls._series[key]
+                builder = cls._builders[(key, intern)] = _compile(model, mapping, intern)
+            cls._builders[(series, intern)] = builder
+        return builder
+
+    @classmethod
+    def create_character(cls, char_data: Dict, series: str) -> Character:
+        """Create a character object based on the series"""
+        return cls._builder(series)(char_data, series)
+
+    @classmethod
+    def create_characters(cls, batch: Iterable[Optional[Dict]], series: str,
+                          on_error: Optional[Callable[[Dict, Exception], None]] = None) -> List[Character]:
+        """Create the characters of many entries of one series.
+
+        None entries are skipped. An entry that fails to build raises, unless
+        `on_error` is given: it is then called with the entry and the error
+        and the entry is skipped.
+        """
+        build = cls._builder(series)
+        if on_error is None:
+            return [build(char_data, series) for char_data in batch if char_data is not None]
+        characters = []
+        for char_data in batch:
+            if char_data is None:
+                continue
+            try:
+                characters.append(build(char_data, series))
+            except Exception as e:
+                on_error(char_data, e)
+        return characters
+
+
+CharacterFactory.register_series('onepiece', OnePieceCharacter, {
+    'epithet': 'epithet',
+    'crew': categorical('crew'),
+    'position': categorical('position'),
+    'origin': categorical('origin'),
+    'hometown': categorical('hometown'),
+    'devil_fruit': 'devilFruit',
+    'bounty': 'bounty',
+    'age': 'age',
+    'birthday': 'birthday',
+    'height': 'height',
+    'blood_type': categorical('bloodType'),
+    'fighting_style': categorical('fighting_style'),
+    'haki': categorical('haki'),
+    'techniques': 'techniques',
+    'family': 'family',
+    'dream': 'dream',
+    'weapons': 'weapons',
+    'achievements': 'achievements',
+    'hobbies': 'hobbies',
+    'weaknesses': 'weaknesses',
+    'laugh': 'laugh',
+})
+
+CharacterFactory.register_series('naruto', NarutoCharacter, {
+    'village': categorical('village'),
+    'rank': categorical('rank'),
+    'clan': categorical('clan'),
+    'jutsu': 'jutsu',
+    'affiliation': categorical('affiliation'),
+    'kekkei_genkai': categorical('kekkeiGenkai'),
+    'nature_type': categorical('natureType'),
+    'family': 'family',
+    'missions_completed': 'missions_completed',
+    'mentor': categorical('mentor'),
+    'students': 'students',
+    'weapons': 'weapons',
+    'summonings': 'summonings',
+    'achievements': 'achievements',
+    'hobbies': 'hobbies',
+    'transformations': 'transformations',
+    'goals': 'goals',
+    'theme_song': 'theme_song',
+})
+
+CharacterFactory.register_series('demonslayer', DemonSlayerCharacter, {
+    'role': categorical('role'),
+    'affiliation': categorical('affiliation'),
+    'breath_style': categorical('breathStyle'),
+    'techniques': 'techniques',
+    'family': 'family',
+    'achievements': 'achievements',
+    'goals': 'goals',
+    'mentor': categorical('mentor'),
+})
+
+CharacterFactory.register_series('attackontitan', AttackOnTitanCharacter, {
+    'age': 'age',
+    'height': 'height',
+    'weight': 'weight',
+    'hair_color': categorical('hairColor'),
+    'eye_color': categorical('eyeColor'),
+    'birthplace': categorical('birthplace'),
+    'skills': 'skills',
+    'titan_form': categorical('titanForm'),
+    'notable_battles': 'notableBattles',
+    'love_interests': 'loveInterests',
+    'fears': 'fears',
+    'hobbies': 'hobbies',
+    'dislikes': 'dislikes',
+    'education': 'education',
+    'affiliations': categorical('affiliations'),
+    'trivia': 'trivia',
+    'injuries_and_scars': 'injuriesAndScars',
+    'titan_kill_count': 'titanKillCount',
+    'human_kill_count': 'humanKillCount',
+    'character_arc': 'characterArc',
+})
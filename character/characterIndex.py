@@ -0,0 +1,613 @@
+import re
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+from dataclasses import fields
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from characterModels import Character
+from characterNumbers import NUMERIC_FIELDS, Number, parse_field
+
+# Long descriptive fields are never used as question answers, indexing them
+# would only duplicate every biography in lower case.
+FREE_TEXT_FIELDS = frozenset({
+    'appearance', 'personality', 'background', 'quotes', 'trivia',
+    'character_arc', 'injuries_and_scars',
+})
+
+# Values held by at least 1 in DENSE_RATIO characters keep a bitmap; rarer
+# ones (ids, names...) only their sorted positions, 4 bytes each instead of
+# a bitmap as long as the index.
+DENSE_RATIO = 32
+
+_CAMEL_BOUNDARY = re.compile(r'(?<=[a-z0-9])([A-Z])')
+_field_names_cache: Dict[type, Tuple[str, ...]] = {}
+
+
+def normalize_field_name(name: str) -> str:
+    """Map JSON style names (hairColor) to model attribute names (hair_color)"""
+    return _CAMEL_BOUNDARY.sub(r'_\1', name).lower()
+
+
+def normalize_value(value: Any) -> Any:
+    """Normalize a value so that lookups are case-insensitive"""
+    if isinstance(value, str):
+        return value.strip().lower()
+    return value
+
+
+def _indexed_field_names(cls: type) -> Tuple[str, ...]:
+    names = _field_names_cache.get(cls)
+    if names is None:
+        names = tuple(f.name for f in fields(cls)
+                      if f.name not in FREE_TEXT_FIELDS and not f.name.startswith('_'))
+        _field_names_cache[cls] = names
+    return names
+
+
+def iter_indexable_values(character: Character) -> Iterator[Tuple[str, Any]]:
+    """Yield (field, normalized value) pairs for every scalar and list entry"""
+    for name in _indexed_field_names(type(character)):
+        value = getattr(character, name)
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            for item in value:
+                if isinstance(item, (str, int, float)):
+                    yield name, normalize_value(item)
+        elif isinstance(value, (str, int, float)):
+            yield name, normalize_value(value)
+
+
+def iter_numeric_values(character: Character) -> Iterator[Tuple[str, Number]]:
+    """Yield (field, number) for every numeric field of a character that parses"""
+    for name, parse in NUMERIC_FIELDS.items():
+        value = getattr(character, name, None)
+        if value is not None:
+            number = parse(value)
+            if number is not None:
+                yield name, number
+
+
+def positions_mask(positions: Iterator[int], size: int) -> int:
+    """Bitmap with the given positions set, for positions below `size`"""
+    bitmap = bytearray((size + 7) >> 3)
+    for position in positions:
+        bitmap[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bitmap, 'little')
+
+
+def sorted_range(numbers: Sequence[Number], low: Optional[Number], high: Optional[Number],
+                 include_low: bool = True, include_high: bool = True) -> Tuple[int, int]:
+    """Slice (start, end) of the ascending `numbers` lying in the range"""
+    start = 0 if low is None else (bisect_left if include_low else bisect_right)(numbers, low)
+    end = len(numbers) if high is None else (bisect_right if include_high else bisect_left)(numbers, high)
+    return start, max(start, end)
+
+
+def iter_positions(mask: int) -> Iterator[int]:
+    """Yield the positions of the set bits of a mask in ascending order"""
+    bits = bin(mask)[:1:-1]
+    position = bits.find('1')
+    while position >= 0:
+        yield position
+        position = bits.find('1', position + 1)
+
+
+class Query(ABC):
+    """Base class for composable character queries"""
+
+    # Queries that must look at every candidate are evaluated last, once the
+    # index-backed terms have narrowed the candidate set down.
+    scans = False
+
+    @abstractmethod
+    def estimate(self, index: 'CharacterIndex') -> int:
+        """Upper bound on the number of matching characters"""
+        pass
+
+    @abstractmethod
+    def evaluate(self, index: 'CharacterIndex', within: int) -> int:
+        """Return the mask of matching characters among the `within` mask"""
+        pass
+
+    def __and__(self, other: 'Query') -> 'Query':
+        return And(self, other)
+
+    def __or__(self, other: 'Query') -> 'Query':
+        return Or(self, other)
+
+    def __invert__(self) -> 'Query':
+        return Not(self)
+
+
+class Eq(Query):
+    """Match characters whose field equals the value (or contains it for list fields).
+
+    Passing a list, tuple or set of values matches any of them.
+    """
+
+    def __init__(self, field: str, value: Any):
+        self.field = normalize_field_name(field)
+        if isinstance(value, (list, tuple, set, frozenset)):
+            self.values = tuple(normalize_value(v) for v in value)
+        else:
+            self.values = (normalize_value(value),)
+
+    def _postings(self, index: 'CharacterIndex') -> int:
+        postings = index.postings(self.field)
+        mask = 0
+        for value in self.values:
+            mask |= postings.get(value, 0)
+        return mask
+
+    def estimate(self, index: 'CharacterIndex') -> int:
+        return sum(index.count(self.field, value) for value in self.values)
+
+    def evaluate(self, index: 'CharacterIndex', within: int) -> int:
+        return self._postings(index) & within
+
+    def __repr__(self):
+        return f"Eq({self.field!r}, {self.values!r})"
+
+
+class Range(Query):
+    """Match characters whose numeric field lies between `low` and `high`.
+
+    Either bound may be None (unbounded) and bounds are inclusive unless
+    told otherwise. Bounds may be given in the units of the data: "180 cm",
+    "1.5 billion" (see characterNumbers). Characters without a parsable
+    value never match.
+    """
+
+    def __init__(self, field: str, low: Any = None, high: Any = None,
+                 include_low: bool = True, include_high: bool = True):
+        self.field = normalize_field_name(field)
+        self.low = self._bound(low)
+        self.high = self._bound(high)
+        self.include_low = include_low
+        self.include_high = include_high
+
+    def _bound(self, value: Any) -> Optional[Number]:
+        if value is None:
+            return None
+        number = parse_field(self.field, value)
+        if number is None:
+            raise ValueError(f"Not a number for {self.field}: {value!r}")
+        return number
+
+    def estimate(self, index: 'CharacterIndex') -> int:
+        return index.range_count(self.field, self.low, self.high, self.include_low, self.include_high)
+
+    def evaluate(self, index: 'CharacterIndex', within: int) -> int:
+        return index.range_mask(self.field, self.low, self.high, self.include_low, self.include_high) & within
+
+    def __repr__(self):
+        return (f"Range({self.field!r}, {'[' if self.include_low else '('}{self.low}, "
+                f"{self.high}{']' if self.include_high else ')'})")
+
+
+def Gt(field: str, value: Any) -> Range:
+    return Range(field, low=value, include_low=False)
+
+
+def Ge(field: str, value: Any) -> Range:
+    return Range(field, low=value)
+
+
+def Lt(field: str, value: Any) -> Range:
+    return Range(field, high=value, include_high=False)
+
+
+def Le(field: str, value: Any) -> Range:
+    return Range(field, high=value)
+
+
+def Between(field: str, low: Any, high: Any) -> Range:
+    return Range(field, low, high)
+
+
+# Keyword filter suffixes, e.g. filter_characters(height__gt='180 cm')
+RANGE_LOOKUPS = {'gt': Gt, 'gte': Ge, 'lt': Lt, 'lte': Le}
+
+
+class NameContains(Query):
+    """Match characters whose name contains the given text (case-insensitive)"""
+
+    scans = True
+
+    def __init__(self, text: str):
+        self.text = text.lower()
+
+    def estimate(self, index: 'CharacterIndex') -> int:
+        return len(index)
+
+    def evaluate(self, index: 'CharacterIndex', within: int) -> int:
+        names = index.lowered_names
+        text = self.text
+        return positions_mask((position for position in iter_positions(within) if text in names[position]),
+                              len(names))
+
+    def __repr__(self):
+        return f"NameContains({self.text!r})"
+
+
+class And(Query):
+    """Match characters satisfying every sub-query"""
+
+    def __init__(self, *queries: Query):
+        self.queries = queries
+        self.scans = any(q.scans for q in queries)
+
+    def estimate(self, index: 'CharacterIndex') -> int:
+        return min((q.estimate(index) for q in self.queries), default=len(index))
+
+    def evaluate(self, index: 'CharacterIndex', within: int) -> int:
+        # Cheapest and most selective terms first so that scans and large
+        # postings only ever see the surviving candidates.
+        plan = sorted(self.queries, key=lambda q: (q.scans, q.estimate(index)))
+        for query in plan:
+            if not within:
+                break
+            within = query.evaluate(index, within)
+        return within
+
+    def __repr__(self):
+        return f"And{self.queries!r}"
+
+
+class Or(Query):
+    """Match characters satisfying at least one sub-query"""
+
+    def __init__(self, *queries: Query):
+        self.queries = queries
+        self.scans = any(q.scans for q in queries)
+
+    def estimate(self, index: 'CharacterIndex') -> int:
+        return min(sum(q.estimate(index) for q in self.queries), len(index))
+
+    def evaluate(self, index: 'CharacterIndex', within: int) -> int:
+        result = 0
+        for query in self.queries:
+            remaining = within & ~result
+            if not remaining:
+                break
+            result |= query.evaluate(index, remaining)
+        return result
+
+    def __repr__(self):
+        return f"Or{self.queries!r}"
+
+
+class Not(Query):
+    """Match characters that do not satisfy the sub-query"""
+
+    def __init__(self, query: Query):
+        self.query = query
+        self.scans = query.scans
+
+    def estimate(self, index: 'CharacterIndex') -> int:
+        return len(index)
+
+    def evaluate(self, index: 'CharacterIndex', within: int) -> int:
+        return within & ~self.query.evaluate(index, within)
+
+    def __repr__(self):
+        return f"Not({self.query!r})"
+
+
+def build_query(*queries: Query, **filters) -> Query:
+    """Combine query objects and keyword filters into a single AND query.
+
+    Keyword filters keep the historic `filter_characters` semantics: None values
+    are ignored and `name_contains` is a partial name match. Numeric fields
+    also take `field__gt`, `__gte`, `__lt`, `__lte` and `__between=(low, high)`.
+    """
+    terms = list(queries)
+    for key, value in filters.items():
+        if value is None:
+            continue
+        field_name, _, lookup = key.rpartition('__')
+        if key == 'name_contains':
+            terms.append(NameContains(value))
+        elif lookup in RANGE_LOOKUPS and field_name:
+            terms.append(RANGE_LOOKUPS[lookup](field_name, value))
+        elif lookup == 'between' and field_name:
+            terms.append(Between(field_name, *value))
+        else:
+            terms.append(Eq(key, value))
+    return And(*terms)
+
+
+class _PostingsView(Mapping):
+    """value -> bitmap of one field of a CharacterIndex or CombinedIndex, built on lookup"""
+
+    __slots__ = ('_index', '_field', '_positions')
+
+    def __init__(self, index: 'CharacterIndex', field: str, positions: Dict[Any, Any]):
+        self._index = index
+        self._field = field
+        self._positions = positions
+
+    def __getitem__(self, value: Any) -> int:
+        if value not in self._positions:
+            raise KeyError(value)
+        return self._index.value_mask(self._field, value)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._positions)
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+
+class CharacterIndex:
+    """Inverted index over the attributes of a list of characters.
+
+    Every character is identified by its position in the index. Posting
+    lists are the sorted positions of the characters having a value (a bare
+    int while there is only one), and queries combine them as integer
+    bitmaps so that AND/OR/NOT are single big-int ops; bitmaps are kept only
+    for dense values (see DENSE_RATIO), rare ones are built when queried.
+    Numeric fields (see characterNumbers) are also parsed into columns kept
+    sorted by value, so range queries are two bisects.
+    """
+
+    def __init__(self, characters: Sequence[Character] = ()):
+        self._characters: List[Character] = []
+        self.lowered_names: List[str] = []
+        # field -> value -> position, or array of positions in ascending order
+        self._positions: Dict[str, Dict[Any, Union[int, array]]] = {}
+        # field -> value -> bitmap, for dense values only
+        self._masks: Dict[str, Dict[Any, int]] = {}
+        # Fields for which a character has more than one value
+        self._multi_valued: Set[str] = set()
+        self._numbers: Dict[str, List[Tuple[Number, int]]] = {}
+        # field -> (sorted numbers, their positions), rebuilt after adds
+        self._sorted: Dict[str, Tuple[List[Number], List[int]]] = {}
+        for character in characters:
+            self.add(character)
+
+    def __len__(self) -> int:
+        return len(self._characters)
+
+    @property
+    def all_mask(self) -> int:
+        return (1 << len(self._characters)) - 1
+
+    def add(self, character: Character) -> int:
+        """Index a character and return its position"""
+        position = len(self._characters)
+        self._characters.append(character)
+        self.lowered_names.append(character.name.lower() if character.name else '')
+        seen: Dict[str, Any] = {}
+        for field_name, value in iter_indexable_values(character):
+            postings = self._positions.get(field_name)
+            if postings is None:
+                postings = self._positions[field_name] = {}
+            entry = postings.get(value)
+            if entry is None:
+                postings[value] = position
+            elif isinstance(entry, int):
+                if entry != position:
+                    postings[value] = array('I', (entry, position))
+            elif entry[-1] != position:
+                entry.append(position)
+            masks = self._masks.get(field_name)
+            if masks:
+                masks.pop(value, None)
+            if seen.setdefault(field_name, value) != value:
+                self._multi_valued.add(field_name)
+        for field_name, number in iter_numeric_values(character):
+            numbers = self._numbers.get(field_name)
+            if numbers is None:
+                numbers = self._numbers[field_name] = []
+            numbers.append((number, position))
+            self._sorted.pop(field_name, None)
+        return position
+
+    def freeze(self):
+        """Sort every numeric column and build the bitmaps of dense values now
+        instead of on the first query"""
+        for field_name in self._numbers:
+            self.numeric_column(field_name)
+        size = len(self)
+        for field_name, postings in self._positions.items():
+            for value, entry in postings.items():
+                if not isinstance(entry, int) and len(entry) * DENSE_RATIO >= size:
+                    self.value_mask(field_name, value)
+
+    def numeric_column(self, field_name: str) -> Tuple[List[Number], List[int]]:
+        """Parsed values of a numeric field in ascending order, and the position of each"""
+        column = self._sorted.get(field_name)
+        if column is None:
+            pairs = sorted(self._numbers.get(field_name, ()))
+            column = self._sorted[field_name] = ([n for n, _ in pairs], [p for _, p in pairs])
+        return column
+
+    def _range(self, field_name: str, low: Optional[Number], high: Optional[Number],
+               include_low: bool, include_high: bool) -> Tuple[List[int], int, int]:
+        numbers, positions = self.numeric_column(field_name)
+        return (positions, *sorted_range(numbers, low, high, include_low, include_high))
+
+    def numeric_fields(self) -> List[str]:
+        """Names of the fields with a numeric column"""
+        return list(self._numbers)
+
+    def numbers(self, field_name: str) -> List[Number]:
+        """Parsed values of a numeric field in ascending order"""
+        return self.numeric_column(normalize_field_name(field_name))[0]
+
+    def range_count(self, field_name: str, low: Optional[Number] = None, high: Optional[Number] = None,
+                    include_low: bool = True, include_high: bool = True) -> int:
+        """Number of characters whose value of a numeric field is in the range"""
+        _, start, end = self._range(field_name, low, high, include_low, include_high)
+        return end - start
+
+    def range_mask(self, field_name: str, low: Optional[Number] = None, high: Optional[Number] = None,
+                   include_low: bool = True, include_high: bool = True) -> int:
+        """Bitmap of the characters whose value of a numeric field is in the range"""
+        positions, start, end = self._range(field_name, low, high, include_low, include_high)
+        return positions_mask(positions[start:end], len(self))
+
+    def positions(self, field_name: str, value: Any) -> Sequence[int]:
+        """Positions of the characters having a value for a field, in ascending order"""
+        entry = self._positions.get(field_name, {}).get(value)
+        if entry is None:
+            return ()
+        return (entry,) if isinstance(entry, int) else entry
+
+    def count(self, field_name: str, value: Any) -> int:
+        """Number of characters having a value for a field"""
+        entry = self._positions.get(field_name, {}).get(value)
+        if entry is None:
+            return 0
+        return 1 if isinstance(entry, int) else len(entry)
+
+    def value_mask(self, field_name: str, value: Any) -> int:
+        """Bitmap of the characters having a value for a field"""
+        masks = self._masks.get(field_name)
+        mask = masks.get(value) if masks else None
+        if mask is None:
+            positions = self.positions(field_name, value)
+            mask = positions_mask(positions, len(self))
+            if len(positions) * DENSE_RATIO >= len(self):
+                self._masks.setdefault(field_name, {})[value] = mask
+        return mask
+
+    def postings(self, field_name: str) -> Mapping:
+        """Map of normalized value -> bitmap for a field (empty if unknown)"""
+        positions = self._positions.get(field_name)
+        return {} if positions is None else _PostingsView(self, field_name, positions)
+
+    def is_multi_valued(self, field_name: str) -> bool:
+        """Whether some character has more than one value for the field (a list field)"""
+        return field_name in self._multi_valued
+
+    def fields(self) -> List[str]:
+        """Names of all indexed fields"""
+        return list(self._positions.keys())
+
+    def values(self, field_name: str) -> List[Any]:
+        """Distinct normalized values seen for a field"""
+        return list(self._positions.get(normalize_field_name(field_name), {}).keys())
+
+    def mask(self, query: Query) -> int:
+        """Evaluate a query to a bitmap of matching positions"""
+        return query.evaluate(self, self.all_mask)
+
+    def select(self, mask: int) -> List[Character]:
+        """Materialize the characters of a bitmap in index order"""
+        characters = self._characters
+        return [characters[position] for position in iter_positions(mask)]
+
+    def query(self, query: Query) -> List[Character]:
+        """Evaluate a query and return the matching characters"""
+        return self.select(self.mask(query))
+
+
+class CombinedIndex:
+    """Read-only union of CharacterIndexes, as if their characters were indexed in order.
+
+    Combining costs nothing per character: each part keeps its own postings
+    and queries shift the part bitmaps to the part's offset, so replacing one
+    part (a reloaded series) does not rebuild the others. Answers the same
+    query interface as CharacterIndex.
+    """
+
+    def __init__(self, parts: Sequence[CharacterIndex]):
+        self._parts = tuple(parts)
+        self._offsets: List[int] = []
+        self._characters: List[Character] = []
+        self.lowered_names: List[str] = []
+        for part in self._parts:
+            self._offsets.append(len(self._characters))
+            self._characters += part._characters
+            self.lowered_names += part.lowered_names
+        # field -> merged (sorted numbers, their positions), built on first use
+        self._sorted: Dict[str, Tuple[List[Number], List[int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._characters)
+
+    @property
+    def all_mask(self) -> int:
+        return (1 << len(self._characters)) - 1
+
+    def _shifted(self, masks: Iterator[int]) -> int:
+        result = 0
+        for mask, offset in zip(masks, self._offsets):
+            if mask:
+                result |= mask << offset
+        return result
+
+    def freeze(self):
+        for part in self._parts:
+            part.freeze()
+
+    def positions(self, field_name: str, value: Any) -> List[int]:
+        """Positions of the characters having a value for a field, in ascending order"""
+        result: List[int] = []
+        for part, offset in zip(self._parts, self._offsets):
+            result += (position + offset for position in part.positions(field_name, value))
+        return result
+
+    def count(self, field_name: str, value: Any) -> int:
+        return sum(part.count(field_name, value) for part in self._parts)
+
+    def value_mask(self, field_name: str, value: Any) -> int:
+        """Bitmap of the characters having a value for a field"""
+        if self.count(field_name, value) * DENSE_RATIO < len(self):
+            return positions_mask(self.positions(field_name, value), len(self))
+        return self._shifted(part.value_mask(field_name, value) if part.count(field_name, value) else 0
+                             for part in self._parts)
+
+    def postings(self, field_name: str) -> Mapping:
+        """Map of normalized value -> bitmap for a field (empty if unknown)"""
+        values = dict.fromkeys(self.values(field_name))
+        return _PostingsView(self, field_name, values) if values else {}
+
+    def is_multi_valued(self, field_name: str) -> bool:
+        return any(part.is_multi_valued(field_name) for part in self._parts)
+
+    def fields(self) -> List[str]:
+        return list(dict.fromkeys(name for part in self._parts for name in part.fields()))
+
+    def values(self, field_name: str) -> List[Any]:
+        return list(dict.fromkeys(value for part in self._parts for value in part.values(field_name)))
+
+    def numeric_fields(self) -> List[str]:
+        return list(dict.fromkeys(name for part in self._parts for name in part.numeric_fields()))
+
+    def numeric_column(self, field_name: str) -> Tuple[List[Number], List[int]]:
+        """Parsed values of a numeric field in ascending order, and the position of each"""
+        column = self._sorted.get(field_name)
+        if column is None:
+            pairs = sorted((number, position + offset)
+                           for part, offset in zip(self._parts, self._offsets)
+                           for number, position in zip(*part.numeric_column(field_name)))
+            column = self._sorted[field_name] = ([n for n, _ in pairs], [p for _, p in pairs])
+        return column
+
+    def numbers(self, field_name: str) -> List[Number]:
+        return self.numeric_column(normalize_field_name(field_name))[0]
+
+    def range_count(self, field_name: str, low: Optional[Number] = None, high: Optional[Number] = None,
+                    include_low: bool = True, include_high: bool = True) -> int:
+        return sum(part.range_count(field_name, low, high, include_low, include_high) for part in self._parts)
+
+    def range_mask(self, field_name: str, low: Optional[Number] = None, high: Optional[Number] = None,
+                   include_low: bool = True, include_high: bool = True) -> int:
+        return self._shifted(part.range_mask(field_name, low, high, include_low, include_high)
+                             for part in self._parts)
+
+    def mask(self, query: Query) -> int:
+        return query.evaluate(self, self.all_mask)
+
+    def select(self, mask: int) -> List[Character]:
+        characters = self._characters
+        return [characters[position] for position in iter_positions(mask)]
+
+    def query(self, query: Query) -> List[Character]:
+        return self.select(self.mask(query))
@@ -0,0 +1,451 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import pickle
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from time import perf_counter
+from types import GeneratorType
+from typing import Any, Callable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from characterFactory import CharacterFactory
+from characterMetrics import Metrics, MetricsLog, NO_METRICS, Stopwatch
+from characterModels import Character
+
+# Bump whenever the Character classes, the factory or the snapshot layout
+# change in a way that makes previously pickled characters invalid.
+SNAPSHOT_VERSION = 3
+SNAPSHOT_SUFFIX = '.snapshot'
+# Amount of text read at a time when streaming a series file
+CHUNK_SIZE = 1 << 16
+# Entries handed to the factory at a time
+BATCH_SIZE = 256
+# Size of the pieces large JSON Lines files are split into for parallel loading
+PARALLEL_CHUNK_BYTES = 8 << 20
+
+logger = logging.getLogger(__name__)
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r'\s*')
+# What may be left of a number cut by the end of the buffer ("12." or "1e-")
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*\Z')
+
+
+def snapshot_path(json_path: str) -> str:
+    """Snapshot file written next to a series JSON file"""
+    return os.path.splitext(json_path)[0] + SNAPSHOT_SUFFIX
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _JSONStream:
+    """Reads a JSON document in chunks, decoding one value at a time"""
+
+    def __init__(self, f: TextIO, chunk_size: int = CHUNK_SIZE):
+        self._file = f
+        self._chunk_size = chunk_size
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character, or '' at the end of the file"""
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, token: str):
+        found = self.peek()
+        if found != token:
+            raise ValueError(f"Expected {token!r} but found {found!r}")
+        self._pos += 1
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._eof or not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk,
+            # even when only its integer part could be decoded so far
+            if not self._eof and _NUMBER_TAIL.match(self._buffer, end) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+
+def _iter_json_array(stream: _JSONStream) -> Iterator[Any]:
+    stream.expect('[')
+    if stream.peek() == ']':
+        stream.expect(']')
+        return
+    while True:
+        yield stream.value()
+        if stream.peek() == ']':
+            stream.expect(']')
+            return
+        stream.expect(',')
+
+
+def iter_json_members(f: TextIO, stream_keys: Sequence[str] = ('body',)) -> Iterator[Tuple[str, Any]]:
+    """Yield the (key, value) members of a top-level JSON object one at a time.
+
+    Array values of `stream_keys` are yielded as iterators over their items
+    instead of lists; items left unconsumed are skipped when advancing.
+    """
+    stream = _JSONStream(f)
+    stream.expect('{')
+    if stream.peek() == '}':
+        return
+    while True:
+        key = stream.value()
+        stream.expect(':')
+        if key in stream_keys and stream.peek() == '[':
+            items = _iter_json_array(stream)
+            yield key, items
+            for _ in items:
+                pass
+        else:
+            yield key, stream.value()
+        if stream.peek() == '}':
+            return
+        stream.expect(',')
+
+
+def _iter_json_body(f: TextIO) -> Iterator[Any]:
+    status = None
+    for key, value in iter_json_members(f):
+        if key == 'status':
+            status = value
+        elif key == 'body':
+            # Files are written with "status" first; skip the body of failed responses
+            if status is not None and status != 200:
+                return
+            if not isinstance(value, GeneratorType):
+                raise ValueError(f"Expected a list body but found {type(value).__name__}")
+            yield from value
+            return
+
+
+def _iter_json_lines(f: TextIO) -> Iterator[Any]:
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_series_entries(path: str) -> Iterator[Any]:
+    """Stream the raw character entries of a series file.
+
+    `.json` files use the `{"status": 200, "body": [...]}` shape and are decoded
+    one body entry at a time; `.jsonl` files hold one character per line.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            yield from _iter_json_lines(f)
+        else:
+            yield from _iter_json_body(f)
+
+
+def _log_build_error(char_data: Any, error: Exception):
+    name = char_data.get('name', 'Unknown') if isinstance(char_data, dict) else 'Unknown'
+    logger.warning("Error creating character %s: %s", name, error)
+
+
+def iter_series_file(path: str, series_name: str, metrics: Metrics = NO_METRICS) -> Iterator[Character]:
+    """Stream the characters of a series file without holding the parsed document.
+
+    Entries are decoded and built BATCH_SIZE at a time. Records the time spent
+    decoding JSON and building characters, and how many entries were loaded,
+    skipped (null) or failed, once the file is consumed.
+    """
+    timing = metrics.enabled
+    decoding, building = Stopwatch(), Stopwatch()
+    loaded = skipped = failed = 0
+    entries = iter_series_entries(path)
+    while True:
+        if timing:
+            decoding.start()
+        batch = list(islice(entries, BATCH_SIZE))
+        if timing:
+            decoding.stop()
+        if not batch:
+            break
+        if timing:
+            building.start()
+        characters = CharacterFactory.create_characters(batch, series_name, _log_build_error)
+        if timing:
+            building.stop()
+        nulls = batch.count(None)
+        skipped += nulls
+        failed += len(batch) - nulls - len(characters)
+        loaded += len(characters)
+        yield from characters
+
+    metrics.increment('load.characters_loaded', loaded, series=series_name)
+    metrics.increment('load.characters_skipped', skipped, series=series_name)
+    metrics.increment('load.characters_failed', failed, series=series_name)
+    if timing:
+        metrics.observe('load.parse_seconds', decoding.seconds, series=series_name)
+        metrics.observe('load.factory_seconds', building.seconds, series=series_name)
+
+
+def parse_series_file(path: str, series_name: str, metrics: Metrics = NO_METRICS) -> List[Character]:
+    """Parse a series file and build its characters"""
+    return list(iter_series_file(path, series_name, metrics))
+
+
+def _header_is_fresh(header: Tuple, json_path: str) -> bool:
+    version, mtime_ns, size, digest = header
+    source = os.stat(json_path)
+    if version != SNAPSHOT_VERSION or size != source.st_size:
+        return False
+    return mtime_ns == source.st_mtime_ns or digest == _file_digest(json_path)
+
+
+def snapshot_is_fresh(json_path: str) -> bool:
+    """Check a snapshot against its JSON file reading only the snapshot header"""
+    try:
+        with open(snapshot_path(json_path), 'rb') as f:
+            return _header_is_fresh(pickle.load(f), json_path)
+    except Exception:
+        return False
+
+
+def _read_snapshot(json_path: str) -> Optional[Tuple[Tuple, List[Character], Any]]:
+    """Header, characters and built object of a fresh snapshot, else None"""
+    try:
+        with open(snapshot_path(json_path), 'rb') as f:
+            data = f.read()
+        stream = io.BytesIO(data)
+        header = pickle.load(stream)
+        if not _header_is_fresh(header, json_path):
+            return None
+        characters, built = pickle.load(stream)
+        return header, characters, built
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("Ignoring unreadable snapshot for %s: %s", json_path, e)
+        return None
+
+
+def read_snapshot(json_path: str) -> Optional[List[Character]]:
+    """Return the snapshot characters if the snapshot matches the JSON file, else None.
+
+    The snapshot is fresh when the source mtime and size are unchanged; if only
+    the mtime moved (e.g. the file was touched or checked out again) the content
+    hash decides.
+    """
+    snapshot = _read_snapshot(json_path)
+    return None if snapshot is None else snapshot[1]
+
+
+def snapshot_header(json_path: str) -> Tuple:
+    """Snapshot header describing the current content of a JSON file.
+
+    Take it before parsing the file: if the file changes during the parse,
+    the snapshot then describes the old content and is found stale, instead
+    of describing the new content while holding the old characters.
+    """
+    source = os.stat(json_path)
+    return SNAPSHOT_VERSION, source.st_mtime_ns, source.st_size, _file_digest(json_path)
+
+
+def write_snapshot(json_path: str, characters: List[Character], header: Optional[Tuple] = None,
+                   built: Any = None):
+    """Write the characters of a JSON file to its snapshot, atomically.
+
+    `header` is the snapshot_header taken before the characters were parsed;
+    without it the file is assumed unchanged since then. `built` is what
+    load_series_file's `build` made of the characters; it is pickled together
+    with them so that the objects they share are restored shared.
+    """
+    if header is None:
+        header = snapshot_header(json_path)
+    path = snapshot_path(json_path)
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    except OSError as e:
+        logger.warning("Could not write snapshot for %s: %s", json_path, e)
+        return
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump((characters, built), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        os.unlink(tmp_path)
+        logger.warning("Could not write snapshot for %s: %s", json_path, e)
+
+
+def _build(build: Callable[[str, List[Character]], Any], series_name: str, characters: List[Character],
+           metrics: Metrics) -> Any:
+    start = perf_counter()
+    built = build(series_name, characters)
+    metrics.observe('load.build_seconds', perf_counter() - start, series=series_name)
+    return built
+
+
+def load_series_file(path: str, series_name: str, use_snapshot: bool = True,
+                     metrics: Metrics = NO_METRICS,
+                     build: Optional[Callable[[str, List[Character]], Any]] = None) -> Any:
+    """Load the characters of a series file, from its snapshot when it is fresh.
+
+    With `build`, return build(series_name, characters) instead of the
+    characters: the result is kept in the snapshot, so what it computes (such
+    as indexes) is loaded back on the next start instead of computed again.
+    """
+    if use_snapshot:
+        start = perf_counter()
+        snapshot = _read_snapshot(path)
+        if snapshot is not None:
+            header, characters, built = snapshot
+            metrics.increment('load.snapshot_hits', series=series_name)
+            metrics.increment('load.characters_loaded', len(characters), series=series_name)
+            metrics.observe('load.snapshot_seconds', perf_counter() - start, series=series_name)
+            if build is None:
+                return characters
+            if built is None:
+                built = _build(build, series_name, characters, metrics)
+                write_snapshot(path, characters, header, built)
+            return built
+        metrics.increment('load.snapshot_misses', series=series_name)
+
+    header = snapshot_header(path) if use_snapshot else None
+    characters = parse_series_file(path, series_name, metrics)
+    built = _build(build, series_name, characters, metrics) if build is not None else None
+    if use_snapshot:
+        write_snapshot(path, characters, header, built)
+    return characters if build is None else built
+
+
+def _parse_json_lines_range(path: str, series_name: str, start: int, end: int,
+                            timed: bool = False) -> Tuple[List[Character], Optional[MetricsLog]]:
+    """Build the characters of the lines of a .jsonl file that start in [start, end).
+
+    With `timed`, also return the metrics of the range, recorded as
+    iter_series_file does for a whole file.
+    """
+    started = perf_counter()
+    entries = []
+    with open(path, 'rb') as f:
+        if start > 0:
+            # The line running across `start` belongs to the previous range
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            entries.append(json.loads(line))
+    decoded = perf_counter()
+    characters = CharacterFactory.create_characters(entries, series_name, _log_build_error)
+    if not timed:
+        return characters, None
+    log = MetricsLog()
+    nulls = entries.count(None)
+    log.increment('load.characters_loaded', len(characters), series=series_name)
+    log.increment('load.characters_skipped', nulls, series=series_name)
+    log.increment('load.characters_failed', len(entries) - nulls - len(characters), series=series_name)
+    log.observe('load.parse_seconds', decoded - started, series=series_name)
+    log.observe('load.factory_seconds', perf_counter() - decoded, series=series_name)
+    return characters, log
+
+
+def _load_series_file_logged(path: str, series_name: str, use_snapshot: bool,
+                             build: Optional[Callable[[str, List[Character]], Any]],
+                             timed: bool) -> Tuple[Any, Optional[MetricsLog]]:
+    """load_series_file run in a worker, with the metrics it recorded when `timed`"""
+    log = MetricsLog() if timed else None
+    return load_series_file(path, series_name, use_snapshot, log or NO_METRICS, build), log
+
+
+def load_series_files(files: Sequence[Tuple[str, str]], use_snapshot: bool = True,
+                      max_workers: Optional[int] = None,
+                      chunk_bytes: int = PARALLEL_CHUNK_BYTES,
+                      build: Optional[Callable[[str, List[Character]], Any]] = None,
+                      metrics: Metrics = NO_METRICS) -> List[Any]:
+    """Load several series files in a process pool.
+
+    `files` holds (path, series name) pairs. Every file is loaded by its own
+    worker; JSON Lines files without a fresh snapshot are also split into
+    byte ranges of about `chunk_bytes` parsed in parallel. The result keeps
+    the order of `files`, with the exception raised for a file in place of its
+    characters, so merging is deterministic regardless of completion order.
+    `build` is applied to the characters of each file as in load_series_file
+    (it must be picklable to run in the workers). The metrics recorded by
+    the workers are sent back with their results and merged into `metrics`.
+    """
+    timed = metrics.enabled
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        plans = []
+        headers = {}
+        for path, series_name in files:
+            try:
+                size = os.path.getsize(path)
+            except OSError as e:
+                plans.append(e)
+                continue
+            if path.endswith('.jsonl') and size > chunk_bytes and not (use_snapshot and snapshot_is_fresh(path)):
+                ranges = [(start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)]
+                headers[path] = snapshot_header(path) if use_snapshot else None
+                plans.append([pool.submit(_parse_json_lines_range, path, series_name, start, end, timed)
+                              for start, end in ranges])
+            else:
+                plans.append(pool.submit(_load_series_file_logged, path, series_name, use_snapshot, build, timed))
+
+        results: List[Any] = []
+        for (path, series_name), plan in zip(files, plans):
+            try:
+                if isinstance(plan, Exception):
+                    raise plan
+                if isinstance(plan, list):
+                    characters = []
+                    for chunk in plan:
+                        chunk_characters, log = chunk.result()
+                        characters += chunk_characters
+                        if log is not None:
+                            log.replay(metrics)
+                    built = _build(build, series_name, characters, metrics) if build is not None else None
+                    if use_snapshot:
+                        write_snapshot(path, characters, headers[path], built)
+                    if build is not None:
+                        characters = built
+                else:
+                    characters, log = plan.result()
+                    if log is not None:
+                        log.replay(metrics)
+                results.append(characters)
+            except Exception as e:
+                results.append(e)
+        return results
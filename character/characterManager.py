@@ -1,16 +1,150 @@
-import json
+import logging
 import os
-from threading import Lock
-from typing import List, Optional, Dict
+import random
+from functools import partial
+from threading import Event, Lock, RLock, Thread
+from time import perf_counter
+from typing import Iterator, List, Optional, Dict, Sequence, Tuple, Union
+from boardSampler import MIN_BOARD_SCORE, BoardSampler
+from characterIndex import CharacterIndex, CombinedIndex, Query, build_query
 from characterFactory import CharacterFactory
-from characterModels import Character
+from characterLoader import iter_series_entries, load_series_file, load_series_files
+from characterMetrics import Metrics, NO_METRICS, timed
+from featureMatrix import export_feature_matrix
+from gameBoard import Board
+from characterModels import Character, HEAVY_TEXT_FIELDS
+from characterSearch import CombinedSearchIndex, NameSearchIndex
+
+logger = logging.getLogger(__name__)
+
+
+class SeriesData:
+    """Immutable characters of one series with their own lookup and search indexes.
+
+    Built once when the series file is parsed and kept in its snapshot, so a
+    warm start loads the indexes instead of building them; CharacterData
+    combines the SeriesData of every series without indexing their
+    characters again.
+    """
+
+    def __init__(self, series: str, characters: Sequence[Character]):
+        self.series = series
+        self.characters: Tuple[Character, ...] = tuple(self._valid_characters(series, characters))
+        self.by_id: Dict[int, Character] = {}
+        # Ids used by more than one character of the series, with their count
+        self.repeated_ids: Dict[int, int] = {}
+        self.by_name: Dict[str, Character] = {}
+        self.index = CharacterIndex()
+        self.search_index = NameSearchIndex()
+        for character in self.characters:
+            self._add_character(character)
+        self.index.freeze()
+        self.search_index.freeze()
+        # Board sampler of the series, built on first use
+        self.board_sampler: Optional[BoardSampler] = None
+
+    @staticmethod
+    def _valid_characters(series: str, characters: Sequence[Character]) -> Iterator[Character]:
+        """Characters that can be indexed, logging and skipping the others"""
+        for character in characters:
+            if not isinstance(character.name, str):
+                logger.warning("Skipping character %r of %s: it has no name", character.id, series)
+                continue
+            yield character
+
+    def _add_character(self, character: Character):
+        """Add a character to the lookup and search indexes"""
+        # Index by ID (the last character loaded with an id wins the plain lookup)
+        if character.id in self.by_id:
+            self.repeated_ids[character.id] = self.repeated_ids.get(character.id, 1) + 1
+        self.by_id[character.id] = character
+
+        # Index by name (case-insensitive)
+        self.by_name[character.name.lower()] = character
+
+        # Index every question-relevant attribute
+        self.index.add(character)
+
+        # Index names and aliases for search and autocomplete
+        self.search_index.add(character)
+
+    def id_count(self, char_id: int) -> int:
+        """Number of characters of the series with an id"""
+        return self.repeated_ids.get(char_id, 1 if char_id in self.by_id else 0)
+
+
+class CharacterData:
+    """Immutable set of loaded characters with all their indexes.
+
+    The manager never modifies a published CharacterData: loading or reloading
+    a series builds a new SeriesData for it and a new CharacterData combining
+    it with the unchanged SeriesData of the other series, then swaps the
+    manager's reference, so a reader that grabbed `manager._data` always sees
+    complete, consistent indexes.
+    """
+    
+    def __init__(self, series: Sequence[SeriesData] = ()):
+        # Series in SERIES_FILES order, so that merges are deterministic
+        self.series: Dict[str, SeriesData] = {part.series: part for part in series}
+        parts = list(self.series.values())
+        characters: List[Character] = []
+        self.by_id: Dict[int, Character] = {}
+        self.by_name: Dict[str, Character] = {}
+        for part in parts:
+            characters += part.characters
+            self.by_id.update(part.by_id)
+            self.by_name.update(part.by_name)
+        self.id_collisions = self._id_collisions(parts)
+        self.index = CombinedIndex([part.index for part in parts])
+        self.search_index = CombinedSearchIndex([part.search_index for part in parts])
+        
+        # Tuples can be handed out to callers as they are, without copying
+        self.characters: Tuple[Character, ...] = tuple(characters)
+        self.by_series: Dict[str, Tuple[Character, ...]] = {
+            part.series: part.characters for part in parts if part.characters}
+        # Board sampler over every character, built on first use
+        self.board_sampler: Optional[BoardSampler] = None
+    
+    @staticmethod
+    def _id_collisions(parts: Sequence[SeriesData]) -> Dict[int, List[str]]:
+        """Ids used by more than one character, with the series of each of them in load order"""
+        colliding = set()
+        seen = set()
+        for part in parts:
+            colliding |= seen & part.by_id.keys()
+            colliding.update(part.repeated_ids)
+            seen |= part.by_id.keys()
+        return {char_id: [part.series for part in parts for _ in range(part.id_count(char_id))]
+                for char_id in colliding}
+
 
 class CharacterManager:
-    """Singleton class to manage character loading and access"""
+    """Singleton class to manage character loading and access.
+
+    Reads are safe from any number of threads without locking: every query
+    works on the CharacterData published when it started, and the sequences
+    it returns are tuples that nobody mutates. Only loading, reloading and
+    hydration take `_load_lock`, and they never block readers of already
+    loaded data.
+    """
     
     _instance = None
     _lock = Lock()
     
+    DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+    SERIES_FILES = ['onepiece.json', 'naruto.json', 'demonslayer.json', 'attackontitan.json']
+    # Cache parsed characters in a pickle snapshot next to each JSON file
+    use_snapshots = True
+    # Load each series file on first access instead of all of them at startup
+    lazy_loading = False
+    # Worker processes used to load the series files in parallel (1 = serial)
+    load_workers = 1
+    # Load timings, counters and query latencies; the default records nothing
+    metrics: Metrics = NO_METRICS
+    # Keep only the fields needed for questions in memory and read the heavy
+    # text fields back from disk when a character is hydrated
+    index_only = False
+    
     def __new__(cls):
         if cls._instance is None:
             with cls._lock:
@@ -21,110 +155,367 @@ class CharacterManager:
     def __init__(self):
         # Only initialize once
         if not hasattr(self, '_initialized'):
-            self._characters = []
-            self._characters_by_id = {}
-            self._characters_by_series = {}
-            self._characters_by_name = {}
-            self._load_all_characters()
+            self._data = CharacterData()
+            self._loaded_series = set()
+            self._file_signatures = {}
+            self._all_loaded = False
+            self._load_lock = RLock()
+            self._watcher = None
+            self._stop_watching = Event()
+            if not self.lazy_loading:
+                self._load_all_characters()
             self._initialized = True
     
     def _load_all_characters(self):
-        """Load all characters from JSON files"""
-        json_files = ['onepiece.json', 'naruto.json', 'demonslayer.json', 'attackontitan.json']
+        """Load all characters from JSON files (or their snapshots when fresh)"""
+        with self._load_lock, self.metrics.capture('load'):
+            pending = [f for f in self.SERIES_FILES if f.split('.')[0] not in self._loaded_series]
+            if self.load_workers > 1 and len(pending) > 1:
+                for file_path in pending:
+                    logger.info("Loading characters from %s", file_path)
+                    self._file_signatures[file_path] = self._file_signature(file_path)
+                files = [(os.path.join(self.DATA_DIR, f), f.split('.')[0]) for f in pending]
+                start = perf_counter()
+                results = load_series_files(files, self.use_snapshots, self.load_workers, build=SeriesData,
+                                            metrics=self.metrics)
+                self.metrics.observe('load.parallel_seconds', perf_counter() - start)
+            else:
+                results = [self._read_series_file(file_path) for file_path in pending]
+            
+            # Merged in SERIES_FILES order whatever order the workers finished in
+            loaded = {}
+            for file_path, part in zip(pending, results):
+                part = self._accept_series(file_path, part)
+                if part is not None:
+                    loaded[part.series] = part
+            self._publish(loaded)
+            # Failed files are not retried, as with eager loading
+            self._loaded_series.update(f.split('.')[0] for f in pending)
+            self._all_loaded = True
         
-        for file_path in json_files:
-            full_path = os.path.join(os.path.dirname(__file__), "..", "data", file_path)
+        logger.info("Loaded %d characters total", len(self._data.characters))
+    
+    def _load_series_file(self, file_path: str):
+        """Load and index one series file unless it was already loaded"""
+        # Extract series name from filename
+        series_name = file_path.split('.')[0]
+        with self._load_lock:
+            if series_name in self._loaded_series:
+                return
+            part = self._accept_series(file_path, self._read_series_file(file_path))
+            if part is not None:
+                self._publish({series_name: part})
+            # Marked only once published, readers check it without the lock
+            self._loaded_series.add(series_name)
+    
+    def _read_series_file(self, file_path: str) -> Union[SeriesData, Exception]:
+        """Read and index the characters of a series file, or the exception that prevented it"""
+        logger.info("Loading characters from %s", file_path)
+        self._file_signatures[file_path] = self._file_signature(file_path)
+        series_name = file_path.split('.')[0]
+        start = perf_counter()
+        try:
+            return load_series_file(os.path.join(self.DATA_DIR, file_path), series_name,
+                                    self.use_snapshots, self.metrics, build=SeriesData)
+        except Exception as e:
+            self.metrics.increment('load.files_failed', series=series_name)
+            return e
+        finally:
+            self.metrics.observe('load.file_seconds', perf_counter() - start, series=series_name)
+    
+    def _accept_series(self, file_path: str, part: Union[SeriesData, Exception]) -> Optional[SeriesData]:
+        """Return the series read from a series file, or report why it failed"""
+        if isinstance(part, FileNotFoundError):
+            logger.warning("%s not found", file_path)
+            return None
+        if isinstance(part, Exception):
+            logger.error("Error loading %s: %s", file_path, part)
+            return None
+        if self.index_only:
+            self._strip_heavy_fields(part.characters)
+        return part
+    
+    def _publish(self, changed: Dict[str, SeriesData]):
+        """Swap in data combining the changed series with the others at once"""
+        start = perf_counter()
+        series = dict(self._data.series)
+        series.update(changed)
+        order = [f.split('.')[0] for f in self.SERIES_FILES]
+        ranked = sorted(series, key=lambda name: order.index(name) if name in order else len(order))
+        data = CharacterData([series[name] for name in ranked])
+        self.metrics.observe('load.publish_seconds', perf_counter() - start)
+        
+        for series_name in changed:
+            collisions = sum(1 for series in data.id_collisions.values()
+                             if series_name in series and series[0] != series_name)
+            if collisions:
+                logger.warning("%d ids in %s are already used by other characters, "
+                               "use get_character_by_id(id, series) to tell them apart", collisions, series_name)
+        # A single reference assignment: readers see either the old or the new data
+        self._data = data
+    
+    def _series_file(self, series: str) -> Optional[str]:
+        """File name of a series, if it is one of SERIES_FILES"""
+        for file_path in self.SERIES_FILES:
+            if file_path.split('.')[0] == series:
+                return file_path
+        return None
+    
+    def _ensure_series_loaded(self, series: str):
+        if self._all_loaded or series in self._loaded_series:
+            return
+        file_path = self._series_file(series)
+        if file_path:
+            self._load_series_file(file_path)
+    
+    def _ensure_all_loaded(self):
+        if not self._all_loaded:
+            with self._load_lock:
+                if not self._all_loaded:
+                    self._load_all_characters()
+    
+    def _strip_heavy_fields(self, characters: Sequence[Character]):
+        """Drop the heavy text fields of the characters of a series until each is hydrated"""
+        occurrences: Dict[Tuple[int, str], int] = {}
+        for character in characters:
+            for name in HEAVY_TEXT_FIELDS:
+                if hasattr(character, name):
+                    setattr(character, name, None)
+            # Ids may repeat: the entry is the n-th one with this id and name
+            key = (character.id, character.name)
+            occurrence = occurrences[key] = occurrences.get(key, -1) + 1
+            character._hydrator = partial(self._hydrate, occurrence)
+    
+    def _hydrate(self, occurrence: int, character: Character):
+        """Restore the heavy text fields of one index-only character from its series file.
+
+        The file is streamed up to the character's entry and only that entry
+        is built.
+        """
+        with self._load_lock:
+            if character._hydrator is None:
+                return
+            series = character.series
+            path = os.path.join(self.DATA_DIR, self._series_file(series))
+            original = None
+            entries = iter_series_entries(path)
             try:
-                print(f"Loading characters from {file_path}")
-                with open(full_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    
-                    if data['status'] != 200:
-                        continue
-                        
-                    # Extract series name from filename
-                    series_name = file_path.split('.')[0]
-                    
-                    for char_data in data['body']:
-                        if char_data is None:
-                            continue
-                            
-                        try:
-                            character = CharacterFactory.create_character(char_data, series_name)
-                            self._characters.append(character)
-                            
-                            # Index by ID
-                            self._characters_by_id[character.id] = character
-                            
-                            # Index by series
-                            if character.series not in self._characters_by_series:
-                                self._characters_by_series[character.series] = []
-                            self._characters_by_series[character.series].append(character)
-                            
-                            # Index by name (case-insensitive)
-                            self._characters_by_name[character.name.lower()] = character
-                            
-                        except Exception as e:
-                            print(f"Error creating character {char_data.get('name', 'Unknown')}: {e}")
-                            continue
-                            
-            except FileNotFoundError:
-                print(f"Warning: {file_path} not found")
-                continue
+                for entry in entries:
+                    if (isinstance(entry, dict) and entry.get('id') == character.id
+                            and entry.get('name') == character.name):
+                        if not occurrence:
+                            original = CharacterFactory.create_character(entry, series)
+                            break
+                        occurrence -= 1
             except Exception as e:
-                print(f"Error loading {file_path}: {e}")
-                continue
-        
-        print(f"Loaded {len(self._characters)} characters total")
+                logger.error("Error reading the details of %s from %s: %s", character.name, path, e)
+            finally:
+                entries.close()
+            if original is None:
+                logger.warning("%s is no longer in %s, its details stay empty", character.name, path)
+            else:
+                for name in HEAVY_TEXT_FIELDS:
+                    if hasattr(character, name):
+                        setattr(character, name, getattr(original, name))
+            character._hydrator = None
+    
+    def _file_signature(self, file_path: str) -> Optional[Tuple[int, int, int]]:
+        """(mtime, size, inode) of a series file, None if it is missing"""
+        try:
+            stat = os.stat(os.path.join(self.DATA_DIR, file_path))
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    
+    def reload_changed(self) -> List[str]:
+        """Reload the loaded series whose files changed on disk, returning their names.
+
+        Only the changed series are parsed again; the new indexes are built
+        aside and published with a single reference swap, so concurrent readers
+        keep using the previous data until the new one is complete. A series
+        whose file disappeared or fails to load keeps its previous characters.
+        """
+        reloaded = {}
+        with self._load_lock:
+            for file_path in self.SERIES_FILES:
+                series_name = file_path.split('.')[0]
+                if series_name not in self._loaded_series:
+                    continue
+                signature = self._file_signature(file_path)
+                if signature is None or signature == self._file_signatures.get(file_path):
+                    continue
+                logger.info("Reloading characters from %s", file_path)
+                self._file_signatures[file_path] = signature
+                try:
+                    part = load_series_file(os.path.join(self.DATA_DIR, file_path), series_name,
+                                            self.use_snapshots, self.metrics, build=SeriesData)
+                except Exception as e:
+                    logger.error("Error reloading %s, keeping the previous characters: %s", file_path, e)
+                    self.metrics.increment('reload.failed', series=series_name)
+                    continue
+                self.metrics.increment('reload.series', series=series_name)
+                if self.index_only:
+                    self._strip_heavy_fields(part.characters)
+                reloaded[series_name] = part
+            if reloaded:
+                self._publish(reloaded)
+        return list(reloaded)
+    
+    def start_watching(self, interval: float = 1.0):
+        """Poll the loaded series files in a background thread and reload them on change"""
+        with self._load_lock:
+            if self._watcher is not None:
+                return
+            self._stop_watching.clear()
+            self._watcher = Thread(target=self._watch, args=(interval,), name='CharacterManagerWatcher',
+                                   daemon=True)
+            self._watcher.start()
+    
+    def stop_watching(self):
+        """Stop the background reload thread"""
+        with self._load_lock:
+            watcher, self._watcher = self._watcher, None
+        if watcher is not None:
+            self._stop_watching.set()
+            watcher.join()
+    
+    def _watch(self, interval: float):
+        while not self._stop_watching.wait(interval):
+            try:
+                self.reload_changed()
+            except Exception:
+                logger.exception("Error reloading characters")
     
-    def get_all_characters(self) -> List[Character]:
-        """Get all loaded characters"""
-        return self._characters.copy()
+    def get_all_characters(self) -> Tuple[Character, ...]:
+        """Get all loaded characters (an immutable tuple shared by all callers)"""
+        self._ensure_all_loaded()
+        return self._data.characters
     
-    def get_character_by_id(self, char_id: int) -> Optional[Character]:
-        """Get a character by ID"""
-        return self._characters_by_id.get(char_id)
+    @timed('query.get_character_by_id')
+    def get_character_by_id(self, char_id: int, series: Optional[str] = None) -> Optional[Character]:
+        """Get a character by ID, within a series when ids repeat across series"""
+        if series is not None:
+            series = series.lower()
+            self._ensure_series_loaded(series)
+            part = self._data.series.get(series)
+            return part.by_id.get(char_id) if part is not None else None
+        self._ensure_all_loaded()
+        return self._data.by_id.get(char_id)
     
-    def get_character_by_name(self, name: str) -> Optional[Character]:
-        """Get a character by name (case-insensitive)"""
-        return self._characters_by_name.get(name.lower())
+    def get_id_collisions(self) -> Dict[int, List[str]]:
+        """Ids used by more than one character, with the series of each of them"""
+        self._ensure_all_loaded()
+        return {char_id: list(series) for char_id, series in self._data.id_collisions.items()}
     
-    def get_characters_by_series(self, series: str) -> List[Character]:
-        """Get characters by series name"""
-        return self._characters_by_series.get(series.lower(), []).copy()
+    @timed('query.get_character_by_name')
+    def get_character_by_name(self, name: str, fuzzy: bool = False) -> Optional[Character]:
+        """Get a character by name (case-insensitive), or the closest name if fuzzy"""
+        self._ensure_all_loaded()
+        data = self._data
+        character = data.by_name.get(name.lower())
+        if character is None and fuzzy:
+            character = data.search_index.closest(name)
+        return character
+    
+    @timed('query.get_characters_by_series')
+    def get_characters_by_series(self, series: str) -> Tuple[Character, ...]:
+        """Get characters by series name as a shared immutable tuple (loading only that series when lazy)"""
+        self._ensure_series_loaded(series.lower())
+        return self._data.by_series.get(series.lower(), ())
     
     def get_available_series(self) -> List[str]:
         """Get list of available series"""
-        return list(self._characters_by_series.keys())
+        self._ensure_all_loaded()
+        return list(self._data.by_series.keys())
     
     def get_character_count(self) -> int:
         """Get total number of characters"""
-        return len(self._characters)
+        self._ensure_all_loaded()
+        return len(self._data.characters)
     
     def get_character_count_by_series(self) -> Dict[str, int]:
         """Get character count by series"""
-        return {series: len(chars) for series, chars in self._characters_by_series.items()}
+        self._ensure_all_loaded()
+        return {series: len(chars) for series, chars in self._data.by_series.items()}
     
-    def search_characters(self, query: str) -> List[Character]:
-        """Search characters by name (partial match, case-insensitive)"""
-        query_lower = query.lower()
-        return [char for char in self._characters if query_lower in char.name.lower()]
+    @timed('query.search_characters')
+    def search_characters(self, query: str, limit: Optional[int] = None, fuzzy: bool = False) -> List[Character]:
+        """Search characters by name or alias (partial match, case-insensitive).
+
+        Results are ranked: exact, then prefix, word prefix and substring matches.
+        With fuzzy=True names a few typos away ("Eren Jaeger") are included last.
+        """
+        self._ensure_all_loaded()
+        return self._data.search_index.search(query, limit=limit, fuzzy=fuzzy)
     
-    def filter_characters(self, **filters) -> List[Character]:
-        """Filter characters by various criteria"""
-        result = self._characters.copy()
-        
-        for key, value in filters.items():
-            if value is None:
-                continue
-                
-            if key == 'series':
-                result = [char for char in result if char.series.lower() == value.lower()]
-            elif key == 'status':
-                result = [char for char in result if char.status and char.status.lower() == value.lower()]
-            elif key == 'name_contains':
-                result = [char for char in result if value.lower() in char.name.lower()]
-            # Add more filters as needed
-        
-        return result
+    @timed('query.autocomplete')
+    def autocomplete(self, prefix: str, limit: Optional[int] = 10) -> List[Character]:
+        """Characters with a name or alias word starting with the prefix"""
+        self._ensure_all_loaded()
+        return self._data.search_index.autocomplete(prefix, limit=limit)
+    
+    @timed('query.filter_characters')
+    def filter_characters(self, *queries: Query, **filters) -> List[Character]:
+        """Filter characters by any attribute using the inverted index.
+
+        Keyword filters match a field by name (either `hair_color` or `hairColor`)
+        and are combined with AND; a list value matches any of its entries.
+        `name_contains` does a partial name match. For OR/NOT combinations pass
+        query objects from `characterIndex`, e.g.
+        `filter_characters(Eq('village', 'Konoha') & ~Eq('status', 'Deceased'))`.
+        Numeric fields (age, height, weight, bounty, kill counts...) answer
+        comparisons from sorted columns: `filter_characters(height__gt='180 cm')`,
+        `bounty__gte='1 billion'`, `age__lt=20` or `Between('age', 16, 19)`.
+        """
+        self._ensure_all_loaded()
+        return self._data.index.query(build_query(*queries, **filters))
+
+    def export_feature_matrix(self, path: str):
+        """Write every character's question attributes to a memory-mappable file.
+
+        Worker processes can open it with `FeatureMatrix(path)` to filter and
+        rank questions on one shared copy instead of loading the characters.
+        """
+        self._ensure_all_loaded()
+        data = self._data
+        export_feature_matrix(path, data.characters, data.index)
+
+    def create_board(self, difficulty: str = 'hard', series: Optional[str] = None,
+                     seed: Optional[int] = None) -> Board:
+        """Draw a Guess Who board for the difficulty, optionally from a single series"""
+        characters = self.get_characters_by_series(series) if series else self.get_all_characters()
+        return Board.random(characters, difficulty, random.Random(seed))
+
+    def board_sampler(self, series: Optional[str] = None) -> BoardSampler:
+        """Sampler of playable boards over a series or every character.
+
+        Built once per loaded data; the sampler of a series is kept until
+        that series is reloaded.
+        """
+        if series is None:
+            self._ensure_all_loaded()
+        else:
+            series = series.lower()
+            self._ensure_series_loaded(series)
+        data = self._data
+        if series is None:
+            if data.board_sampler is None:
+                data.board_sampler = BoardSampler(data.characters)
+            return data.board_sampler
+        part = data.series.get(series)
+        if part is None:
+            return BoardSampler(())
+        if part.board_sampler is None:
+            part.board_sampler = BoardSampler(part.characters)
+        return part.board_sampler
+
+    def generate_boards(self, difficulty: str = 'hard', count: int = 1, series: Optional[str] = None,
+                        seed: Optional[int] = None, min_score: float = MIN_BOARD_SCORE) -> List[Board]:
+        """Draw a batch of boards worth playing, optionally from a single series.
 
+        Unlike `create_board`, no two characters of a board answer every
+        question alike, and the questions of the board must split it well
+        (see BoardSampler.score). Raises ValueError when the characters
+        cannot make such a board.
+        """
+        return self.board_sampler(series).sample(difficulty, count, random.Random(seed), min_score)
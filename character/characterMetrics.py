@@ -0,0 +1,195 @@
+import cProfile
+import io
+import pstats
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets, 1us to 10s
+LATENCY_BUCKETS = tuple(10.0 ** exponent * step for exponent in range(-6, 1) for step in (1, 2.5, 5)) + (10.0,)
+
+
+class Metrics:
+    """No-op metrics sink used by default.
+
+    Instrumented code checks `enabled` before taking any timing, so leaving
+    the default in place costs one attribute lookup per instrumented call.
+    """
+
+    enabled = False
+
+    def increment(self, name: str, value: int = 1, **tags):
+        """Add to a counter"""
+        pass
+
+    def observe(self, name: str, seconds: float, **tags):
+        """Record one duration in a latency histogram"""
+        pass
+
+    def capture(self, name: str):
+        """Context manager profiling a block of code (nothing by default)"""
+        return nullcontext()
+
+
+NO_METRICS = Metrics()
+
+
+def _key(name: str, tags: Dict[str, Any]) -> str:
+    if not tags:
+        return name
+    return name + '{' + ','.join(f"{k}={v}" for k, v in sorted(tags.items())) + '}'
+
+
+class Histogram:
+    """Cumulative latency histogram over LATENCY_BUCKETS"""
+
+    __slots__ = ('count', 'total', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def to_dict(self) -> Dict:
+        cumulative, running = {}, 0
+        for bound, count in zip(LATENCY_BUCKETS + (float('inf'),), self.buckets):
+            running += count
+            cumulative[repr(bound)] = running
+        return {'count': self.count, 'sum': self.total, 'buckets': cumulative}
+
+
+class RecordingMetrics(Metrics):
+    """Keeps counters and latency histograms in memory for scraping"""
+
+    enabled = True
+
+    def __init__(self):
+        self._lock = Lock()
+        self.counters: Dict[str, int] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def increment(self, name: str, value: int = 1, **tags):
+        key = _key(name, tags)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **tags):
+        key = _key(name, tags)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.add(seconds)
+
+    def snapshot(self) -> Dict:
+        """Counters and histograms as plain data (e.g. to serve as JSON)"""
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'histograms': {key: h.to_dict() for key, h in self.histograms.items()},
+            }
+
+
+class MetricsLog(Metrics):
+    """Records every metric call so that it can be replayed into other metrics.
+
+    Used where the caller's metrics are out of reach, e.g. in a worker
+    process: the log is returned with the result and replayed by the caller.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.calls: List[Tuple[str, str, float, Dict[str, Any]]] = []
+
+    def increment(self, name: str, value: int = 1, **tags):
+        self.calls.append(('increment', name, value, tags))
+
+    def observe(self, name: str, seconds: float, **tags):
+        self.calls.append(('observe', name, seconds, tags))
+
+    def replay(self, metrics: Metrics):
+        """Record the logged calls in `metrics`"""
+        for method, name, value, tags in self.calls:
+            getattr(metrics, method)(name, value, **tags)
+
+
+class ProfilingMetrics(RecordingMetrics):
+    """Recording metrics that also profile captured blocks with cProfile and tracemalloc"""
+
+    def __init__(self, cpu: bool = True, memory: bool = True, top: int = 25):
+        super().__init__()
+        self.cpu = cpu
+        self.memory = memory
+        self.top = top
+        self.captures: Dict[str, Dict] = {}
+
+    @contextmanager
+    def capture(self, name: str) -> Iterator[None]:
+        profiler = cProfile.Profile() if self.cpu else None
+        tracing = self.memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            result = {}
+            if profiler:
+                profiler.disable()
+                report = io.StringIO()
+                pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(self.top)
+                result['cpu'] = report.getvalue()
+            if self.memory and tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                result['memory'] = {
+                    'current_bytes': current,
+                    'peak_bytes': peak,
+                    'top': [str(stat) for stat in tracemalloc.take_snapshot().statistics('lineno')[:self.top]],
+                }
+                if tracing:
+                    tracemalloc.stop()
+            self.captures[name] = result
+
+
+def timed(name: str) -> Callable:
+    """Record the latency of a method in `self.metrics` under `name`"""
+    def decorator(method: Callable) -> Callable:
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            metrics = self.metrics
+            if not metrics.enabled:
+                return method(self, *args, **kwargs)
+            start = perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                metrics.observe(name, perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class Stopwatch:
+    """Accumulates the time spent in several separate intervals"""
+
+    __slots__ = ('seconds', '_start')
+
+    def __init__(self):
+        self.seconds = 0.0
+        self._start: Optional[float] = None
+
+    def start(self):
+        self._start = perf_counter()
+
+    def stop(self):
+        self.seconds += perf_counter() - self._start
@@ -1,8 +1,11 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Optional, List, Dict, Union
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Union, Callable
 
-@dataclass
+# Long text fields that index-only loading leaves on disk until needed
+HEAVY_TEXT_FIELDS = ('background', 'personality', 'character_arc', 'quotes')
+
+@dataclass(slots=True)
 class Character(ABC):
     """Abstract base class for all character types"""
     id: int
@@ -17,6 +20,18 @@ class Character(ABC):
     quotes: Optional[List[str]] = None
     first_appearance: Optional[str] = None
     series: Optional[str] = None
+    # Set when the heavy text fields were skipped at load time
+    _hydrator: Optional[Callable[['Character'], None]] = field(default=None, init=False, repr=False, compare=False)
+
+    def hydrate(self):
+        """Load the heavy text fields (HEAVY_TEXT_FIELDS) if they were skipped at load time.
+
+        Call it before reading those fields of a character loaded index-only.
+        """
+        hydrator = self._hydrator
+        if hydrator is not None:
+            hydrator(self)
+
     @abstractmethod
     def get_specific_info(self) -> Dict:
         """Get anime-specific information"""
@@ -27,7 +42,7 @@ class Character(ABC):
         """Display detailed character information"""
         pass
 
-@dataclass
+@dataclass(slots=True)
 class OnePieceCharacter(Character):
     """One Piece specific character"""
     epithet: Optional[str] = None
@@ -84,7 +99,7 @@ class OnePieceCharacter(Character):
         if self.dream:
             print(f"Dream: {self.dream}")
 
-@dataclass
+@dataclass(slots=True)
 class NarutoCharacter(Character):
     """Naruto specific character"""
     village: Optional[str] = None
@@ -134,7 +149,7 @@ class NarutoCharacter(Character):
         if self.mentor:
             print(f"Mentor: {self.mentor}")
 
-@dataclass
+@dataclass(slots=True)
 class DemonSlayerCharacter(Character):
     """Demon Slayer specific character"""
     role: Optional[str] = None
@@ -170,7 +185,7 @@ class DemonSlayerCharacter(Character):
         if self.mentor:
             print(f"Mentor: {self.mentor}")
 
-@dataclass
+@dataclass(slots=True)
 class AttackOnTitanCharacter(Character):
     """Attack on Titan specific character"""
     age: Optional[Union[int, str]] = None
@@ -182,7 +197,7 @@ class AttackOnTitanCharacter(Character):
     skills: Optional[List[str]] = None
     titan_form: Optional[str] = None
     notable_battles: Optional[List[str]] = None
-    love_interests: Optional[str] = None
+    love_interests: Optional[Union[str, List[str]]] = None
     fears: Optional[str] = None
     hobbies: Optional[str] = None
     dislikes: Optional[str] = None
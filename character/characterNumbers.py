@@ -0,0 +1,121 @@
+import re
+from typing import Any, Callable, Dict, Optional, Union
+
+Number = Union[int, float]
+
+_NUMBER = re.compile(r'-?\d+(?:[.,]\d+)*')
+_UNIT_LENGTH = re.compile(r'(\d+(?:[.,]\d+)?)\s*(cm|centimet(?:er|re)s?|m|met(?:er|re)s?)\b')
+_FEET_INCHES = re.compile(r"(\d+(?:\.\d+)?)\s*(?:'|ft|feet|foot)\s*(?:(\d+(?:\.\d+)?)\s*(?:\"|''|in|inch|inches)?)?")
+_MAGNITUDES = {
+    'thousand': 1e3, 'k': 1e3,
+    'million': 1e6, 'm': 1e6, 'mil': 1e6,
+    'billion': 1e9, 'b': 1e9, 'bn': 1e9,
+    'trillion': 1e12, 't': 1e12,
+}
+_MAGNITUDE = re.compile(r'(-?\d+(?:[.,]\d+)*)\s*(thousand|million|billion|trillion|mil|bn|k|m|b|t)\b', re.IGNORECASE)
+
+
+def _tidy(value: float) -> Number:
+    return int(value) if float(value).is_integer() else value
+
+
+def _to_float(digits: str) -> float:
+    """Read "3,000,000", "1.5", "1,5" and "1,234.5" style numbers"""
+    if ',' in digits and '.' in digits:
+        decimal = max(digits.rfind(','), digits.rfind('.'))
+        return float(re.sub(r'[.,]', '', digits[:decimal]) + '.' + digits[decimal + 1:])
+    separator = ',' if ',' in digits else '.' if '.' in digits else None
+    if separator is None:
+        return float(digits)
+    groups = digits.split(separator)
+    if len(groups) > 2 or (separator == ',' and len(groups[1]) == 3):
+        return float(digits.replace(separator, ''))    # thousands separators
+    return float(digits.replace(',', '.'))
+
+
+def _first_number(text: str) -> Optional[float]:
+    match = _NUMBER.search(text)
+    return None if match is None else _to_float(match.group())
+
+
+def parse_number(value: Any) -> Optional[Number]:
+    """Ages and counts: 19, "20", "19 (pre-timeskip)" -> 19; "Unknown" -> None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        number = _first_number(value)
+        return None if number is None else _tidy(number)
+    return None
+
+
+def parse_count(value: Any) -> Optional[Number]:
+    """Counts that may be broken down by kind, e.g. {"S": 10, "A": 25} -> 35"""
+    if isinstance(value, dict):
+        numbers = [n for n in map(parse_number, value.values()) if n is not None]
+        return _tidy(sum(numbers)) if numbers else None
+    return parse_number(value)
+
+
+def parse_length(value: Any) -> Optional[Number]:
+    """Heights in centimetres: "170 cm", "1.70 m", "15 meters", "5'7\\"" and plain numbers"""
+    if not isinstance(value, str):
+        number = parse_number(value)
+        return None if number is None else _tidy(number * 100 if number < 3 else number)
+    text = value.lower()
+    unit = _UNIT_LENGTH.search(text)
+    if unit is not None:
+        number = _to_float(unit.group(1))
+        return _tidy(number if unit.group(2).startswith('c') else round(number * 100, 1))
+    feet = _FEET_INCHES.search(text)
+    if feet is not None:
+        inches = float(feet.group(1)) * 12 + float(feet.group(2) or 0)
+        return round(inches * 2.54, 1)
+    number = _first_number(text)
+    if number is None:
+        return None
+    return _tidy(round(number * 100, 1) if number < 3 else number)
+
+
+def parse_weight(value: Any) -> Optional[Number]:
+    """Weights in kilograms: "63 kg", "140 lbs" and plain numbers"""
+    if not isinstance(value, str):
+        return parse_number(value)
+    number = _first_number(value)
+    if number is None:
+        return None
+    if re.search(r'\d\s*(?:lb|lbs|pounds?)\b', value.lower()):
+        return round(number * 0.45359237, 1)
+    return _tidy(number)
+
+
+def parse_amount(value: Any) -> Optional[Number]:
+    """Money: "3,000,000,000", "550,000,000 Berries", "1.5 billion" -> 1500000000"""
+    if not isinstance(value, str):
+        return parse_number(value)
+    magnitude = _MAGNITUDE.search(value)
+    if magnitude is not None:
+        number = _to_float(magnitude.group(1))
+        return _tidy(round(number * _MAGNITUDES[magnitude.group(2).lower()]))
+    number = _first_number(value)
+    return None if number is None else _tidy(number)
+
+
+# Model attributes holding numbers, with the parser normalizing them
+# (heights in cm, weights in kg, bounties in berries)
+NUMERIC_FIELDS: Dict[str, Callable[[Any], Optional[Number]]] = {
+    'age': parse_number,
+    'height': parse_length,
+    'weight': parse_weight,
+    'bounty': parse_amount,
+    'titan_kill_count': parse_count,
+    'human_kill_count': parse_count,
+    'missions_completed': parse_count,
+}
+
+
+def parse_field(field_name: str, value: Any) -> Optional[Number]:
+    """Normalize a value of a numeric field; numbers pass through for other fields"""
+    parser = NUMERIC_FIELDS.get(field_name, parse_number)
+    return parser(value)
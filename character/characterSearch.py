@@ -0,0 +1,272 @@
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from characterModels import Character
+
+# Fields holding alternative names a player may type
+ALIAS_FIELDS = ('epithet',)
+
+# Ranking tiers, best first
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING, FUZZY = range(5)
+
+
+def normalize_text(text: str) -> str:
+    """Lower-case and strip accents so that "Zoë" and "zoe" compare equal"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).strip()
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def bounded_edit_distance(a: str, b: str, limit: int) -> Optional[int]:
+    """Edit distance between a and b counting adjacent swaps as one edit
+    ("jaeger" -> "yeager" is two edits), or None if it exceeds limit
+    """
+    if abs(len(a) - len(b)) > limit:
+        return None
+    before_previous: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before_previous[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return None
+        before_previous, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else None
+
+
+def _ranked(characters: Sequence[Character], scored: Dict[int, Tuple], limit: Optional[int]) -> List[Character]:
+    order = sorted(scored, key=lambda position: (scored[position], position))
+    if limit is not None:
+        order = order[:limit]
+    return [characters[position] for position in order]
+
+
+def default_max_distance(query: str) -> int:
+    """Typos tolerated for a query of this length"""
+    if len(query) <= 3:
+        return 0
+    if len(query) <= 7:
+        return 1
+    return 2
+
+
+class NameSearchIndex:
+    """Substring, prefix and fuzzy search over character names and aliases.
+
+    Every name or alias is an entry; a trigram index narrows substring and fuzzy
+    queries down to a few entries, and a sorted list of word suffixes
+    ("eren yeager", "yeager") answers prefix queries with a binary search.
+    """
+
+    def __init__(self):
+        self._characters: List[Character] = []
+        self._entries: List[Tuple[str, int]] = []  # (normalized text, character position)
+        self._trigrams: Dict[str, Set[int]] = {}
+        # length -> entries whose text or one of its words has that length
+        self._lengths: Dict[int, Set[int]] = {}
+        self._prefixes: List[Tuple[str, int]] = []  # (word suffix of an entry, entry)
+        self._prefixes_sorted = True
+
+    def __len__(self) -> int:
+        return len(self._characters)
+
+    def add(self, character: Character):
+        position = len(self._characters)
+        self._characters.append(character)
+        names = [character.name or '']
+        for field_name in ALIAS_FIELDS:
+            alias = getattr(character, field_name, None)
+            if isinstance(alias, str) and alias:
+                names.append(alias)
+
+        for name in names:
+            text = normalize_text(name)
+            entry = len(self._entries)
+            self._entries.append((text, position))
+            for gram in trigrams(text):
+                self._trigrams.setdefault(gram, set()).add(entry)
+            for length in {len(text), *map(len, text.split())}:
+                self._lengths.setdefault(length, set()).add(entry)
+            start = 0
+            while start >= 0:
+                self._prefixes.append((text[start:], entry))
+                start = text.find(' ', start)
+                if start >= 0:
+                    start += 1
+        self._prefixes_sorted = False
+
+    def _candidate_entries(self, query: str) -> List[int]:
+        """Entries that may contain the query, from the rarest of its trigrams"""
+        grams = trigrams(query)
+        if not grams:
+            return list(range(len(self._entries)))
+        postings = sorted((self._trigrams.get(g, set()) for g in grams), key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            if not result:
+                break
+            result &= posting
+        return sorted(result)
+
+    def freeze(self):
+        """Finish the index before sharing it between threads"""
+        self._sorted_prefixes()
+
+    def _sorted_prefixes(self) -> List[Tuple[str, int]]:
+        if not self._prefixes_sorted:
+            self._prefixes.sort()
+            self._prefixes_sorted = True
+        return self._prefixes
+
+    @staticmethod
+    def _keep_best(scored: Dict[int, Tuple], position: int, score: Tuple):
+        if position not in scored or score < scored[position]:
+            scored[position] = score
+
+    def search(self, query: str, limit: Optional[int] = None, fuzzy: bool = False,
+               max_distance: Optional[int] = None) -> List[Character]:
+        """Characters whose name or alias contains the query, best matches first.
+
+        Exact matches rank before prefix matches, then word prefix and plain
+        substring matches. With fuzzy=True, names within `max_distance` edits of
+        the query (or of one of its words) are appended after them.
+        """
+        query = normalize_text(query)
+        if not query:
+            return self._characters[:limit] if limit is not None else list(self._characters)
+        return _ranked(self._characters, self._search_scores(query, fuzzy, max_distance), limit)
+
+    def _search_scores(self, query: str, fuzzy: bool, max_distance: Optional[int]) -> Dict[int, Tuple]:
+        """Ranking score of every character matching a normalized, non-empty query"""
+        scored: Dict[int, Tuple] = {}
+        for entry in self._candidate_entries(query):
+            text, position = self._entries[entry]
+            found = text.find(query)
+            if found < 0:
+                continue
+            if text == query:
+                tier = EXACT
+            elif found == 0:
+                tier = PREFIX
+            elif text[found - 1] == ' ':
+                tier = WORD_PREFIX
+            else:
+                tier = SUBSTRING
+            self._keep_best(scored, position, (tier, len(text)))
+
+        if fuzzy:
+            if max_distance is None:
+                max_distance = default_max_distance(query)
+            for position, distance, length in self._fuzzy_matches(query, max_distance):
+                self._keep_best(scored, position, (FUZZY, distance, length))
+        return scored
+
+    def _fuzzy_matches(self, query: str, max_distance: int):
+        """(position, distance, length) of the entries within max_distance edits"""
+        if max_distance <= 0:
+            return
+        words = query.split()
+        grams = trigrams(query)
+        # Each edit destroys at most three trigrams of the query (q-gram lemma)
+        required = len(grams) - 3 * max_distance
+        if required > 0:
+            shared: Dict[int, int] = {}
+            for gram in grams:
+                for entry in self._trigrams.get(gram, ()):
+                    shared[entry] = shared.get(entry, 0) + 1
+            candidates = [entry for entry, count in shared.items() if count >= required]
+        else:
+            # Too short for the typos to leave a trigram: every entry with a
+            # name or word of about the query's length is a candidate
+            candidates = set()
+            for length in range(len(query) - max_distance, len(query) + max_distance + 1):
+                candidates.update(self._lengths.get(length, ()))
+        for entry in sorted(candidates):
+            text, position = self._entries[entry]
+            distances = [bounded_edit_distance(query, text, max_distance)]
+            if len(words) == 1:
+                distances += [bounded_edit_distance(query, word, max_distance) for word in text.split()]
+            distances = [d for d in distances if d is not None]
+            if distances:
+                yield position, min(distances), len(text)
+
+    def autocomplete(self, prefix: str, limit: Optional[int] = 10) -> List[Character]:
+        """Characters with a name or alias word starting with the prefix"""
+        return _ranked(self._characters, self._autocomplete_scores(normalize_text(prefix)), limit)
+
+    def _autocomplete_scores(self, prefix: str) -> Dict[int, Tuple]:
+        """Ranking score of every character with a word starting with a normalized prefix"""
+        prefixes = self._sorted_prefixes()
+        scored: Dict[int, Tuple] = {}
+        i = bisect_left(prefixes, (prefix, -1))
+        while i < len(prefixes) and prefixes[i][0].startswith(prefix):
+            entry = prefixes[i][1]
+            text, position = self._entries[entry]
+            tier = PREFIX if text.startswith(prefix) else WORD_PREFIX
+            self._keep_best(scored, position, (tier, len(text)))
+            i += 1
+        return scored
+
+    def closest(self, name: str, max_distance: Optional[int] = None) -> Optional[Character]:
+        """Best fuzzy match for a full name, e.g. "Eren Jaeger" -> "Eren Yeager" """
+        matches = self.search(name, limit=1, fuzzy=True, max_distance=max_distance)
+        return matches[0] if matches else None
+
+
+class CombinedSearchIndex:
+    """Read-only union of NameSearchIndexes, ranking their matches together.
+
+    Each part keeps its own trigram and prefix indexes, so combining is
+    free and replacing a part (a reloaded series) does not rebuild the
+    others. Answers the same queries as NameSearchIndex.
+    """
+
+    def __init__(self, parts: Sequence[NameSearchIndex]):
+        self._parts = tuple(parts)
+        self._offsets: List[int] = []
+        self._characters: List[Character] = []
+        for part in self._parts:
+            self._offsets.append(len(self._characters))
+            self._characters += part._characters
+
+    def __len__(self) -> int:
+        return len(self._characters)
+
+    def freeze(self):
+        for part in self._parts:
+            part.freeze()
+
+    def _combined(self, part_scores) -> Dict[int, Tuple]:
+        scored: Dict[int, Tuple] = {}
+        for scores, offset in zip(part_scores, self._offsets):
+            for position, score in scores.items():
+                scored[position + offset] = score
+        return scored
+
+    def search(self, query: str, limit: Optional[int] = None, fuzzy: bool = False,
+               max_distance: Optional[int] = None) -> List[Character]:
+        """See NameSearchIndex.search"""
+        query = normalize_text(query)
+        if not query:
+            return self._characters[:limit] if limit is not None else list(self._characters)
+        scored = self._combined(part._search_scores(query, fuzzy, max_distance) for part in self._parts)
+        return _ranked(self._characters, scored, limit)
+
+    def autocomplete(self, prefix: str, limit: Optional[int] = 10) -> List[Character]:
+        """See NameSearchIndex.autocomplete"""
+        prefix = normalize_text(prefix)
+        scored = self._combined(part._autocomplete_scores(prefix) for part in self._parts)
+        return _ranked(self._characters, scored, limit)
+
+    def closest(self, name: str, max_distance: Optional[int] = None) -> Optional[Character]:
+        """Best fuzzy match for a full name, e.g. "Eren Jaeger" -> "Eren Yeager" """
+        matches = self.search(name, limit=1, fuzzy=True, max_distance=max_distance)
+        return matches[0] if matches else None
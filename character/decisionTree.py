@@ -0,0 +1,271 @@
+import hashlib
+import heapq
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from weakref import WeakKeyDictionary
+
+from characterIndex import iter_positions, positions_mask
+from characterModels import Character
+from gameBoard import Board, Question
+from questionSelector import split_entropy
+
+# 2: questions carry their operator (threshold questions on numeric fields)
+FORMAT_VERSION = 2
+
+# (series, id) identifies a character even when ids repeat across series
+CharacterKey = Tuple[str, int]
+
+
+def character_key(character: Character) -> CharacterKey:
+    return (character.series or '', character.id)
+
+
+class DecisionTree:
+    """Serialized questioning strategy for one board.
+
+    Nodes are stored as flat tuples (question index, yes node, no node, leaf mask)
+    so that walking the tree is a list lookup per answer. Leaf masks refer to
+    positions in `characters`, which is sorted so the tree does not depend on the
+    order of the board it was built from.
+    """
+
+    def __init__(self, characters: Sequence[CharacterKey], questions: Sequence[Question],
+                 nodes: Sequence[Tuple[int, int, int, int]]):
+        self.characters: Tuple[CharacterKey, ...] = tuple(tuple(c) for c in characters)
+        self.questions: Tuple[Question, ...] = tuple(questions)
+        self.nodes: Tuple[Tuple[int, int, int, int], ...] = tuple(tuple(n) for n in nodes)
+
+    def walk(self) -> 'TreeWalker':
+        """Start a new walk from the root"""
+        return TreeWalker(self)
+
+    def expected_questions(self) -> float:
+        """Average number of questions needed to isolate a uniformly chosen secret"""
+        total = 0
+
+        def visit(node: int, depth: int):
+            nonlocal total
+            question, yes, no, mask = self.nodes[node]
+            if question < 0:
+                total += depth * mask.bit_count()
+            else:
+                visit(yes, depth + 1)
+                visit(no, depth + 1)
+
+        visit(0, 0)
+        return total / len(self.characters) if self.characters else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            'version': FORMAT_VERSION,
+            'characters': [list(c) for c in self.characters],
+            'questions': [[q.field, q.value, q.op] for q in self.questions],
+            'nodes': [list(n) for n in self.nodes],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'DecisionTree':
+        if data.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported decision tree version: {data.get('version')}")
+        return cls(data['characters'], [Question(*q) for q in data['questions']], data['nodes'])
+
+    def save(self, path: str):
+        """Write the tree as JSON, atomically replacing any previous file"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> 'DecisionTree':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+class TreeWalker:
+    """Position of one game in a decision tree"""
+
+    __slots__ = ('tree', 'node')
+
+    def __init__(self, tree: DecisionTree):
+        self.tree = tree
+        self.node = 0
+
+    @property
+    def question(self) -> Optional[Question]:
+        """Next question to ask, or None once the candidates can't be split further"""
+        index = self.tree.nodes[self.node][0]
+        return self.tree.questions[index] if index >= 0 else None
+
+    def answer(self, yes: bool):
+        """Follow the branch for the answer to the current question"""
+        _, yes_node, no_node, _ = self.tree.nodes[self.node]
+        if yes_node < 0:
+            raise ValueError("The walk already reached a leaf")
+        self.node = yes_node if yes else no_node
+
+    def remaining(self) -> List[CharacterKey]:
+        """Characters left at a leaf (more than one only if indistinguishable)"""
+        mask = self.tree.nodes[self.node][3]
+        return [self.tree.characters[position] for position in iter_positions(mask)]
+
+
+def build_tree(characters: Sequence[Character], questions: Optional[Sequence[Question]] = None,
+               beam: int = 3) -> DecisionTree:
+    """Build a near-optimal decision tree minimizing the expected number of questions.
+
+    At every node the `beam` most informative questions are expanded and the
+    one with the lowest total depth is kept; results are memoized per candidate
+    set. beam=1 is the plain greedy strategy.
+    """
+    board = Board(sorted(characters, key=character_key))
+    if questions is None:
+        questions = board.questions
+    questions = sorted(set(questions), key=lambda q: (q.field, str(q.value), q.op))
+    masks = [board.answer_mask(q) for q in questions]
+    memo: Dict[int, Tuple[int, int]] = {}
+
+    def solve(candidates: int) -> int:
+        # Cost is the sum of the depths of all candidates (expected depth * n)
+        cached = memo.get(candidates)
+        if cached is not None:
+            return cached[0]
+        total = candidates.bit_count()
+        best_cost, best_question = 0, -1
+        if total > 1:
+            scored = []
+            for i, mask in enumerate(masks):
+                yes = (candidates & mask).bit_count()
+                if 0 < yes < total:
+                    scored.append((split_entropy(yes, total), -i))
+            for _, negative_i in heapq.nlargest(beam, scored):
+                mask = masks[-negative_i]
+                cost = total + solve(candidates & mask) + solve(candidates & ~mask)
+                if best_question < 0 or cost < best_cost:
+                    best_cost, best_question = cost, -negative_i
+        memo[candidates] = (best_cost, best_question)
+        return best_cost
+
+    nodes: List[Tuple[int, int, int, int]] = []
+
+    def emit(candidates: int) -> int:
+        node = len(nodes)
+        question = memo[candidates][1]
+        if question < 0:
+            nodes.append((-1, -1, -1, candidates))
+            return node
+        nodes.append(None)
+        yes = emit(candidates & masks[question])
+        no = emit(candidates & ~masks[question])
+        nodes[node] = (question, yes, no, candidates)
+        return node
+
+    solve(board.full_mask)
+    emit(board.full_mask)
+    return DecisionTree([character_key(c) for c in board.characters], questions, nodes)
+
+
+class DecisionTreeCache:
+    """LRU cache of decision trees keyed by board, optionally backed by a directory.
+
+    Boards are reused across many games, so a tree is built at most once per
+    process (or once per host when a directory is shared).
+    """
+
+    def __init__(self, maxsize: int = 256, directory: Optional[str] = None, beam: int = 3):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.beam = beam
+        self._trees: 'OrderedDict[str, DecisionTree]' = OrderedDict()
+        # Key of every live board, which are immutable and asked for many times
+        self._board_keys: 'WeakKeyDictionary[Board, str]' = WeakKeyDictionary()
+        self._lock = Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(characters: Union[Board, Sequence[Character]], questions: Optional[Sequence[Question]] = None) -> str:
+        """Digest of the sorted character ids, the question set and its answers.
+
+        The answer masks are part of the key, so a tree cached before the
+        characters' attributes were reloaded is not reused for the new ones.
+        Without `questions`, the board's questions are used.
+        """
+        board = characters if isinstance(characters, Board) else Board(characters)
+        keys = [character_key(c) for c in board.characters]
+        order = sorted(range(board.size), key=keys.__getitem__)
+        # Masks in sorted id order, so that the key does not depend on the board order
+        rank = [0] * board.size
+        for sorted_position, position in enumerate(order):
+            rank[position] = sorted_position
+        question_key = sorted(
+            (q.field, str(q.value), q.op,
+             positions_mask((rank[p] for p in iter_positions(board.answer_mask(q))), board.size))
+            for q in set(board.questions if questions is None else questions))
+        payload = json.dumps([[keys[p] for p in order], question_key], ensure_ascii=False)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def get(self, characters: Union[Board, Sequence[Character]],
+            questions: Optional[Sequence[Question]] = None) -> DecisionTree:
+        """Return the tree for a board, building and caching it if needed.
+
+        Pass the Board itself when there is one: its key is computed once.
+        """
+        board = characters if isinstance(characters, Board) else None
+        if board is not None and questions is None:
+            with self._lock:
+                key = self._board_keys.get(board)
+            if key is None:
+                key = self.key(board)
+                with self._lock:
+                    self._board_keys[board] = key
+        else:
+            key = self.key(characters, questions)
+        if board is not None:
+            characters = board.characters
+        with self._lock:
+            tree = self._trees.get(key)
+            if tree is not None:
+                self._trees.move_to_end(key)
+                return tree
+
+        tree = self._load(key)
+        if tree is None:
+            tree = build_tree(characters, questions, beam=self.beam)
+            self._store(key, tree)
+
+        with self._lock:
+            self._trees[key] = tree
+            self._trees.move_to_end(key)
+            while len(self._trees) > self.maxsize:
+                self._trees.popitem(last=False)
+        return tree
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load(self, key: str) -> Optional[DecisionTree]:
+        if not self.directory:
+            return None
+        try:
+            return DecisionTree.load(self._path(key))
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+
+    def _store(self, key: str, tree: DecisionTree):
+        if self.directory:
+            tree.save(self._path(key))
+
+    def clear(self):
+        """Drop the in-memory entries (the disk cache is kept)"""
+        with self._lock:
+            self._trees.clear()
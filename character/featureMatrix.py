@@ -0,0 +1,367 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from characterIndex import (CharacterIndex, Query, iter_positions, normalize_field_name, positions_mask,
+                            sorted_range)
+from characterModels import Character
+from characterNumbers import Number
+from gameBoard import NON_QUESTION_FIELDS, Question, make_question
+
+MAGIC = b'GWFM'
+FORMAT_VERSION = 2
+# Sections of the file, each stored at an aligned (offset, length)
+METADATA, ROWS, CODES, FEATURE_TABLE, FEATURE_DATA, DICTIONARY, NUMERIC = range(7)
+# magic, version, byte order, rows, features, category fields, then the
+# (offset, length) of every section
+_HEADER = struct.Struct('<4sHBxQQQ14Q')
+_ALIGN = 64
+# Threshold questions per numeric field, at evenly spaced distinct values
+MAX_THRESHOLDS = 64
+
+
+def _aligned(offset: int, alignment: int = _ALIGN) -> int:
+    return -(-offset // alignment) * alignment
+
+
+def _split_fields(index: CharacterIndex) -> Tuple[List[str], List[str]]:
+    """Fields with at most one value per character (category) and list fields (multi)"""
+    category, multi = [], []
+    for field_name in index.fields():
+        (multi if index.is_multi_valued(field_name) else category).append(field_name)
+    return category, multi
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def export_feature_matrix(path: str, characters: Sequence[Character], index: Optional[CharacterIndex] = None):
+    """Write the question-relevant attributes of the characters to a feature matrix file.
+
+    Every (field, value) pair is a feature column: a bitmap over the rows,
+    or the sorted list of its rows when that is smaller (ids, names and other
+    rare values). Category fields also get a row-major matrix of value codes,
+    and numeric fields their sorted values and rows for range queries.
+    `index` may be a CharacterIndex already built over exactly these
+    characters, in the same order. The file is written to a temporary file
+    and renamed, so readers never map a partial matrix.
+    """
+    if index is None:
+        index = CharacterIndex(characters)
+    size = len(characters)
+    category, multi = _split_fields(index)
+    stride = _aligned(size, 64) // 8
+
+    fields, features, dictionary = [], [], bytearray()
+    for field_name in category + multi:
+        field_values = index.values(field_name)
+        values = _dumps(field_values)
+        fields.append({'name': field_name, 'kind': 'category' if field_name in category else 'multi',
+                       'first_feature': len(features), 'count': len(field_values),
+                       'values': [len(dictionary), len(values)]})
+        dictionary += values
+        features += ((field_name, value) for value in field_values)
+
+    # Feature table: (offset in FEATURE_DATA, row count, dense flag) per feature
+    table = array('Q')
+    data_length = 0
+    for field_name, value in features:
+        count = index.count(field_name, value)
+        dense = 4 * count >= stride
+        table.extend((data_length, count, dense))
+        data_length += stride if dense else _aligned(4 * count, 8)
+
+    # Row-major category codes: position in the field's dictionary + 1, 0 when missing
+    codes = array('I', bytes(4 * size * len(category)))
+    for column, field_name in enumerate(category):
+        for code, value in enumerate(index.values(field_name), 1):
+            for row in index.positions(field_name, value):
+                codes[row * len(category) + column] = code
+
+    # Numeric columns: the sorted doubles, then the rows they belong to
+    numeric, numeric_fields = bytearray(), {}
+    for field_name in index.numeric_fields():
+        numbers, positions = index.numeric_column(field_name)
+        numeric_fields[field_name] = [len(numeric), len(numbers)]
+        numeric += array('d', numbers).tobytes()
+        numeric += array('I', positions).tobytes().ljust(_aligned(4 * len(positions), 8), b'\0')
+
+    metadata = _dumps({'fields': fields, 'category_fields': category, 'numeric': numeric_fields})
+    rows = _dumps([[c.series, c.id, c.name] for c in characters])
+    lengths = (len(metadata), len(rows), len(codes) * codes.itemsize, len(table) * table.itemsize,
+               data_length, len(dictionary), len(numeric))
+    layout = []
+    offset = _aligned(_HEADER.size)
+    for length in lengths:
+        layout += [offset, length]
+        offset = _aligned(offset + length)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, sys.byteorder == 'little', size, len(features),
+                          len(category), *layout)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            for section, data in ((METADATA, metadata), (ROWS, rows), (CODES, codes),
+                                  (FEATURE_TABLE, table), (DICTIONARY, dictionary), (NUMERIC, numeric)):
+                f.seek(layout[2 * section])
+                f.write(data)
+            f.seek(layout[2 * FEATURE_DATA])
+            for feature, (field_name, value) in enumerate(features):
+                if table[3 * feature + 2]:
+                    f.write(index.value_mask(field_name, value).to_bytes(stride, 'little'))
+                else:
+                    positions = array('I', index.positions(field_name, value)).tobytes()
+                    f.write(positions.ljust(_aligned(len(positions), 8), b'\0'))
+            f.truncate(offset)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class _FieldPostings(Mapping):
+    """value -> bitmap of one field, decoded from the mapped file on every lookup"""
+
+    __slots__ = ('_matrix', '_field', '_codes')
+
+    def __init__(self, matrix: 'FeatureMatrix', field: Dict):
+        self._matrix = matrix
+        self._field = field
+        self._codes: Optional[Dict[Any, int]] = None
+
+    @property
+    def codes(self) -> Dict[Any, int]:
+        """value -> feature number, parsed from the dictionary on first use"""
+        if self._codes is None:
+            first = self._field['first_feature']
+            self._codes = {value: first + code
+                           for code, value in enumerate(self._matrix.field_values(self._field['name']))}
+        return self._codes
+
+    def __getitem__(self, value: Any) -> int:
+        return self._matrix.feature_mask(self.codes[value])
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.codes)
+
+    def __len__(self) -> int:
+        return self._field['count']
+
+
+class FeatureMatrix:
+    """Read-only, memory-mapped view of an exported feature matrix.
+
+    Every process mapping the same file shares one physical copy of it
+    through the page cache, and opening only parses the list of fields;
+    value dictionaries and row keys are read on first use. The matrix answers
+    the CharacterIndex query interface (Eq, And, Or, Not, NameContains...)
+    and the Board interface used by `rank_questions`.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view: Optional[memoryview] = None
+        self._casts: List[memoryview] = []
+        try:
+            (magic, version, little, self.size, feature_count, category_count,
+             *layout) = _HEADER.unpack_from(self._mmap)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"{path} is not a version {FORMAT_VERSION} feature matrix")
+            if bool(little) != (sys.byteorder == 'little'):
+                raise ValueError(f"{path} was written on a host with a different byte order")
+            self._view = memoryview(self._mmap)
+            self._layout = layout
+            metadata = json.loads(bytes(self._section(METADATA)))
+        except BaseException:
+            self.close()
+            raise
+        self._codes = self._cast(CODES, 'I')
+        self._table = self._cast(FEATURE_TABLE, 'Q')
+        self._data_offset = layout[2 * FEATURE_DATA]
+        self._stride = _aligned(self.size, 64) // 8
+        self.full_mask = (1 << self.size) - 1
+
+        self.category_fields: Tuple[str, ...] = tuple(metadata['category_fields'])
+        self._category_columns = {name: column for column, name in enumerate(self.category_fields)}
+        self._fields: Dict[str, Dict] = {field['name']: field for field in metadata['fields']}
+        self._values: Dict[str, List] = {}
+        self._postings = {name: _FieldPostings(self, field) for name, field in self._fields.items()}
+        self._numeric: Dict[str, List[int]] = metadata['numeric']
+        self._numeric_columns: Dict[str, Tuple[memoryview, memoryview]] = {}
+        self._questions: Optional[Tuple[Question, ...]] = None
+        self._rows: Optional[List[List]] = None
+        self._lowered_names: Optional[List[str]] = None
+
+    def _section(self, section: int) -> memoryview:
+        offset, length = self._layout[2 * section], self._layout[2 * section + 1]
+        return self._view[offset:offset + length]
+
+    def _cast(self, section: int, fmt: str) -> memoryview:
+        view = self._section(section).cast(fmt)
+        self._casts.append(view)
+        return view
+
+    def close(self):
+        """Release the mapping; views handed out before must not be used afterwards"""
+        for view in self._casts:
+            view.release()
+        self._casts.clear()
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        self._mmap.close()
+
+    def __enter__(self) -> 'FeatureMatrix':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.size
+
+    # -- CharacterIndex interface -------------------------------------------
+
+    @property
+    def all_mask(self) -> int:
+        return self.full_mask
+
+    @property
+    def lowered_names(self) -> List[str]:
+        if self._lowered_names is None:
+            self._lowered_names = [(name or '').lower() for _, _, name in self.rows]
+        return self._lowered_names
+
+    def feature_mask(self, feature: int) -> int:
+        """Bitmap of the rows having a feature, read straight from the mapping"""
+        offset, count, dense = self._table[3 * feature:3 * feature + 3]
+        start = self._data_offset + offset
+        if dense:
+            return int.from_bytes(self._view[start:start + self._stride], 'little')
+        bitmap = bytearray(self._stride)
+        for row in self._view[start:start + 4 * count].cast('I'):
+            bitmap[row >> 3] |= 1 << (row & 7)
+        return int.from_bytes(bitmap, 'little')
+
+    def postings(self, field_name: str) -> Mapping:
+        """Map of normalized value -> bitmap for a field (empty if unknown)"""
+        return self._postings.get(field_name, {})
+
+    def count(self, field_name: str, value: Any) -> int:
+        """Number of rows having a value for a field"""
+        postings = self._postings.get(field_name)
+        feature = postings.codes.get(value) if postings is not None else None
+        return 0 if feature is None else self._table[3 * feature + 1]
+
+    def fields(self) -> List[str]:
+        return list(self._fields)
+
+    def field_values(self, field_name: str) -> List[Any]:
+        """Distinct normalized values of a field, in feature order"""
+        values = self._values.get(field_name)
+        if values is None:
+            field = self._fields.get(field_name)
+            if field is None:
+                return []
+            start, length = field['values']
+            offset = self._layout[2 * DICTIONARY] + start
+            values = self._values[field_name] = json.loads(bytes(self._view[offset:offset + length]))
+        return values
+
+    def values(self, field_name: str) -> List[Any]:
+        return list(self.field_values(normalize_field_name(field_name)))
+
+    def mask(self, query: Query) -> int:
+        """Evaluate a query to a bitmap of matching rows"""
+        return query.evaluate(self, self.full_mask)
+
+    def numeric_fields(self) -> List[str]:
+        return list(self._numeric)
+
+    def numeric_column(self, field_name: str) -> Tuple[Sequence[Number], Sequence[int]]:
+        """Sorted values of a numeric field and their rows, as views of the mapping"""
+        column = self._numeric_columns.get(field_name)
+        if column is None:
+            start, count = self._numeric.get(field_name, (0, 0))
+            offset = self._layout[2 * NUMERIC] + start
+            numbers = self._view[offset:offset + 8 * count].cast('d')
+            positions = self._view[offset + 8 * count:offset + 12 * count].cast('I')
+            self._casts += (numbers, positions)
+            column = self._numeric_columns[field_name] = (numbers, positions)
+        return column
+
+    def numbers(self, field_name: str) -> Sequence[Number]:
+        return self.numeric_column(normalize_field_name(field_name))[0]
+
+    def range_count(self, field_name: str, low: Optional[Number] = None, high: Optional[Number] = None,
+                    include_low: bool = True, include_high: bool = True) -> int:
+        start, end = sorted_range(self.numeric_column(field_name)[0], low, high, include_low, include_high)
+        return end - start
+
+    def range_mask(self, field_name: str, low: Optional[Number] = None, high: Optional[Number] = None,
+                   include_low: bool = True, include_high: bool = True) -> int:
+        """Bitmap of the rows whose value of a numeric field is in the range"""
+        numbers, positions = self.numeric_column(field_name)
+        start, end = sorted_range(numbers, low, high, include_low, include_high)
+        return positions_mask(positions[start:end], self.size)
+
+    # -- Board interface ----------------------------------------------------
+
+    def _thresholds(self, field_name: str) -> List[Number]:
+        # Doubles in the file; whole numbers go back to ints like on a Board
+        distinct = sorted({int(n) if n.is_integer() else n for n in self.numbers(field_name)})[:-1]
+        if len(distinct) <= MAX_THRESHOLDS:
+            return distinct
+        return [distinct[i * len(distinct) // MAX_THRESHOLDS] for i in range(MAX_THRESHOLDS)]
+
+    @property
+    def questions(self) -> Tuple[Question, ...]:
+        if self._questions is None:
+            questions = [Question(name, value) for name in self._fields
+                         if name not in NON_QUESTION_FIELDS for value in self.field_values(name)]
+            questions += [Question(name, threshold, '>') for name in self._numeric
+                          for threshold in self._thresholds(name)]
+            self._questions = tuple(questions)
+        return self._questions
+
+    def answer_mask(self, question: Question) -> int:
+        if question.op == '>':
+            return self.range_mask(question.field, low=question.value, include_low=False)
+        postings = self._postings.get(question.field)
+        feature = postings.codes.get(question.value) if postings is not None else None
+        return 0 if feature is None else self.feature_mask(feature)
+
+    def question(self, field: str, value: Any, op: str = '=') -> Question:
+        return make_question(field, value, op)
+
+    # -- rows ---------------------------------------------------------------
+
+    @property
+    def rows(self) -> List[List]:
+        """[series, id, name] of every row, parsed on first use"""
+        if self._rows is None:
+            self._rows = json.loads(bytes(self._section(ROWS)))
+        return self._rows
+
+    def keys(self, mask: int) -> List[Tuple[str, int]]:
+        """(series, id) of the rows of a bitmap, to look characters up in a CharacterManager"""
+        rows = self.rows
+        return [(rows[row][0], rows[row][1]) for row in iter_positions(mask)]
+
+    def value(self, row: int, field_name: str) -> Any:
+        """Normalized value of a category field for a row (None when missing or not a category field)"""
+        column = self._category_columns.get(field_name)
+        if column is None:
+            return None
+        code = self._codes[row * len(self.category_fields) + column]
+        return self.field_values(field_name)[code - 1] if code else None
@@ -0,0 +1,202 @@
+import random
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from characterIndex import (CharacterIndex, iter_indexable_values, iter_numeric_values, iter_positions,
+                            normalize_field_name, normalize_value, positions_mask)
+from characterModels import Character
+from characterNumbers import Number, parse_field
+
+# Number of characters on the board for every difficulty of the Flutter game
+DIFFICULTY_SIZES = {
+    'easy': 4,      # 2x2
+    'medium': 9,    # 3x3
+    'hard': 16,     # 4x4
+    'expert': 32,   # two 4x4 grids
+}
+
+# Asking for these is a guess, not a question
+NON_QUESTION_FIELDS = frozenset({'id', 'name'})
+
+
+# Question operators: equality, and "greater than" for numeric fields
+QUESTION_OPS = ('=', '>')
+
+
+@dataclass(frozen=True)
+class Question:
+    """A yes/no question: does the character have `value` for `field`?
+
+    With op '>' it asks whether the character's numeric value of the field
+    is greater than `value` instead (height > 180?).
+    """
+    field: str
+    value: Any
+    op: str = '='
+
+    def __str__(self):
+        return f"{self.field} {self.op} {self.value}?"
+
+
+def make_question(field: str, value: Any, op: str = '=') -> Question:
+    """Question with a normalized field and value ("180 cm" becomes 180 for thresholds)"""
+    field = normalize_field_name(field)
+    if op == '=':
+        return Question(field, normalize_value(value))
+    if op not in QUESTION_OPS:
+        raise ValueError(f"Unknown question operator: {op!r}")
+    number = parse_field(field, value)
+    if number is None:
+        raise ValueError(f"Not a number for {field}: {value!r}")
+    return Question(field, number, op)
+
+
+class Board:
+    """Immutable set of characters with a precomputed answer mask per question.
+
+    Characters are identified by their position on the board; a set of
+    remaining candidates is an int whose bit i stands for position i. Boards
+    hold no per-game state and can be shared by any number of games.
+    `questions` only lists the questions worth asking; any other question
+    is answered from the characters' values, threshold questions with a
+    bisect over the board's sorted numeric columns.
+    """
+
+    def __init__(self, characters: Sequence[Character], answer_masks: Optional[Dict[Question, int]] = None):
+        """`answer_masks` may be passed when already known (see BoardSampler)"""
+        self.characters: Tuple[Character, ...] = tuple(characters)
+        self.size = len(self.characters)
+        self.full_mask = (1 << self.size) - 1
+        self._positions = {id(character): i for i, character in enumerate(self.characters)}
+        columns: Dict[str, List[Tuple[Number, int]]] = {}
+        for position, character in enumerate(self.characters):
+            for field_name, number in iter_numeric_values(character):
+                columns.setdefault(field_name, []).append((number, position))
+        # field -> (ascending numbers, position of each)
+        self._columns: Dict[str, Tuple[List[Number], List[int]]] = {}
+        for field_name, column in columns.items():
+            column.sort()
+            self._columns[field_name] = ([n for n, _ in column], [p for _, p in column])
+        if answer_masks is None:
+            answer_masks = self._index_answers()
+        self._answer_masks: Dict[Question, int] = answer_masks
+        self.questions: Tuple[Question, ...] = tuple(answer_masks)
+
+    def _index_answers(self) -> Dict[Question, int]:
+        index = CharacterIndex(self.characters)
+        answer_masks = {}
+        for field_name in index.fields():
+            if field_name in NON_QUESTION_FIELDS:
+                continue
+            for value, mask in index.postings(field_name).items():
+                # A question every character answers "yes" to tells nothing
+                if mask != self.full_mask:
+                    answer_masks[Question(field_name, value)] = mask
+        # Numeric fields also get a threshold question between every two
+        # consecutive values on the board
+        for field_name, (numbers, _) in self._columns.items():
+            for threshold in sorted(set(numbers))[:-1]:
+                question = Question(field_name, threshold, '>')
+                answer_masks[question] = self._threshold_mask(question)
+        return answer_masks
+
+    @classmethod
+    def random(cls, characters: Sequence[Character], difficulty: str = 'hard',
+               rng: Optional[random.Random] = None) -> 'Board':
+        """Draw a board of the size matching the difficulty"""
+        size = DIFFICULTY_SIZES[difficulty]
+        if len(characters) < size:
+            raise ValueError(f"Need {size} characters for a {difficulty} board, got {len(characters)}")
+        return cls((rng or random).sample(list(characters), size))
+
+    def question(self, field: str, value: Any, op: str = '=') -> Question:
+        """Build a question using the board's normalized field and value"""
+        return make_question(field, value, op)
+
+    def answer_mask(self, question: Question) -> int:
+        """Mask of the characters that answer "yes" to the question"""
+        mask = self._answer_masks.get(question)
+        if mask is None:
+            mask = self._threshold_mask(question) if question.op == '>' else self._value_mask(question)
+        return mask
+
+    def _threshold_mask(self, question: Question) -> int:
+        """Mask of the characters whose value of a numeric field is above the question's"""
+        column = self._columns.get(question.field)
+        if column is None:
+            return 0
+        numbers, positions = column
+        return positions_mask(positions[bisect_right(numbers, question.value):], self.size)
+
+    def _value_mask(self, question: Question) -> int:
+        """Answer mask of an equality question that is not in `questions`, read off the characters"""
+        mask = 0
+        key = (question.field, question.value)
+        for position, character in enumerate(self.characters):
+            if key in iter_indexable_values(character):
+                mask |= 1 << position
+        return mask
+
+    def position(self, character: Character) -> int:
+        """Position of a character on the board"""
+        try:
+            return self._positions[id(character)]
+        except KeyError:
+            raise ValueError(f"{character.name} is not on this board") from None
+
+    def answer(self, question: Question, position: int) -> bool:
+        """Answer a question for the character at the given position"""
+        return bool(self.answer_mask(question) >> position & 1)
+
+    def eliminate(self, candidates: int, question: Question, answer: bool) -> int:
+        """Remove from the candidates every character inconsistent with the answer"""
+        if answer:
+            return candidates & self.answer_mask(question)
+        return candidates & ~self.answer_mask(question)
+
+    def characters_in(self, candidates: int) -> List[Character]:
+        """Characters of a candidate mask, in board order"""
+        characters = self.characters
+        return [characters[position] for position in iter_positions(candidates)]
+
+
+class RoundState:
+    """Per-game state of one player's board: the secret and the remaining candidates"""
+
+    __slots__ = ('board', 'secret', 'candidates', 'questions_asked')
+
+    def __init__(self, board: Board, secret: int):
+        if not 0 <= secret < board.size:
+            raise ValueError(f"Secret position {secret} is outside the board")
+        self.board = board
+        self.secret = secret
+        self.candidates = board.full_mask
+        self.questions_asked = 0
+
+    def ask(self, question: Question) -> bool:
+        """Ask about the opponent's secret character and apply the answer"""
+        return self.ask_mask(self.board.answer_mask(question))
+
+    def ask_mask(self, mask: int) -> bool:
+        """Ask a question given its answer mask (see Board.answer_mask)"""
+        answer = bool(mask >> self.secret & 1)
+        self.candidates = self.candidates & mask if answer else self.candidates & ~mask
+        self.questions_asked += 1
+        return answer
+
+    def apply(self, question: Question, answer: bool):
+        """Eliminate the candidates inconsistent with an answer"""
+        self.candidates = self.board.eliminate(self.candidates, question, answer)
+        self.questions_asked += 1
+
+    def guess(self, position: int) -> bool:
+        """Check a final guess"""
+        return position == self.secret
+
+    @property
+    def remaining(self) -> int:
+        return self.candidates.bit_count()
+
+    def remaining_characters(self) -> List[Character]:
+        return self.board.characters_in(self.candidates)
@@ -0,0 +1,395 @@
+"""Asyncio service hosting many concurrent Guess Who games.
+
+Usage: python character/gameSessions.py [--host HOST] [--port PORT]
+
+The server speaks two protocols on the same port: an HTTP POST with a JSON
+body gets a JSON response, and any other connection is a stream of JSON
+messages, one per line, standing in for a WebSocket. Every message has an
+"op" ("create", "ask", "guess", "state" or "close"), see GameService.handle.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import secrets
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+from characterIndex import iter_positions
+from characterManager import CharacterManager
+from gameBoard import DIFFICULTY_SIZES, Board, Question, RoundState
+
+logger = logging.getLogger(__name__)
+
+# Boards drawn per (difficulty, series) before new games start reusing them
+BOARD_POOL_SIZE = 256
+# Games untouched for this many seconds are dropped
+SESSION_IDLE_SECONDS = 30 * 60
+SWEEP_INTERVAL = 60.0
+MAX_PLAYERS = 2
+# Largest HTTP request body accepted by the server
+MAX_BODY_BYTES = 1 << 16
+
+_ASK, _GUESS = range(2)
+
+
+class SessionError(ValueError):
+    """Invalid request for a game (unknown session, wrong turn, game over...)"""
+    pass
+
+
+class GameSession:
+    """One game on a shared Board.
+
+    Player i tries to find `rounds[i].secret`, the character picked by the
+    opponent (or at random in single-player games). With two players turns
+    alternate; a correct guess wins and a wrong guess loses the game.
+    """
+
+    __slots__ = ('session_id', 'board', 'rounds', 'turn', 'finished', 'winner', 'last_active')
+
+    def __init__(self, session_id: str, board: Board, secrets_: Tuple[int, ...], now: float):
+        self.session_id = session_id
+        self.board = board
+        self.rounds = tuple(RoundState(board, secret) for secret in secrets_)
+        self.turn = 0
+        self.finished = False
+        self.winner: Optional[int] = None
+        self.last_active = now
+
+    def round_for(self, player: int) -> RoundState:
+        """Round state of a player who is allowed to play now"""
+        if not 0 <= player < len(self.rounds):
+            raise SessionError(f"Unknown player {player}")
+        if self.finished:
+            raise SessionError("The game is over")
+        if player != self.turn:
+            raise SessionError(f"It is player {self.turn}'s turn")
+        return self.rounds[player]
+
+    def end_turn(self):
+        self.turn = (self.turn + 1) % len(self.rounds)
+
+    def guess(self, player: int, position: int) -> bool:
+        correct = self.round_for(player).guess(position)
+        self.finished = True
+        if correct:
+            self.winner = player
+        elif len(self.rounds) > 1:
+            self.winner = (player + 1) % len(self.rounds)
+        return correct
+
+    def state(self, player: int) -> Dict[str, Any]:
+        if not 0 <= player < len(self.rounds):
+            raise SessionError(f"Unknown player {player}")
+        round_state = self.rounds[player]
+        state = {
+            'session': self.session_id,
+            'player': player,
+            'turn': self.turn,
+            'finished': self.finished,
+            'winner': self.winner,
+            'questions_asked': round_state.questions_asked,
+            'remaining': list(iter_positions(round_state.candidates)),
+        }
+        if self.finished:
+            state['secret'] = round_state.secret
+        return state
+
+
+class GameService:
+    """Creates games and answers their moves on one event loop.
+
+    Sessions hold a reference to a pooled Board, never copies of characters, so
+    an idle game costs a few hundred bytes. Moves are queued and answered
+    together once per event-loop tick: every distinct (board, question) answer
+    mask is looked up once per batch however many games ask it.
+    """
+
+    def __init__(self, manager: Optional[CharacterManager] = None,
+                 board_pool_size: int = BOARD_POOL_SIZE,
+                 idle_seconds: float = SESSION_IDLE_SECONDS,
+                 seed: Optional[int] = None):
+        self.manager = manager or CharacterManager()
+        self.board_pool_size = board_pool_size
+        self.idle_seconds = idle_seconds
+        self.sessions: Dict[str, GameSession] = {}
+        self._rng = random.Random(seed)
+        self._boards: Dict[Tuple[str, Optional[str]], List[Board]] = {}
+        self._board_payloads: 'WeakKeyDictionary[Board, Dict]' = WeakKeyDictionary()
+        self._pending: List[Tuple] = []
+        self._flush_scheduled = False
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    # -- sessions ----------------------------------------------------------
+
+    def _board(self, difficulty: str, series: Optional[str]) -> Board:
+        """Draw a new board until the pool is full, then reuse pooled boards"""
+        if difficulty not in DIFFICULTY_SIZES:
+            raise SessionError(f"Unknown difficulty {difficulty!r}")
+        pool = self._boards.setdefault((difficulty, series), [])
+        if len(pool) < self.board_pool_size:
+            try:
+                board = self.manager.generate_boards(difficulty, 1, series, self._rng.getrandbits(32))[0]
+            except ValueError as e:
+                raise SessionError(str(e)) from None
+            pool.append(board)
+            return board
+        return self._rng.choice(pool)
+
+    def clear_boards(self):
+        """Forget pooled boards, e.g. after the characters were reloaded"""
+        self._boards.clear()
+
+    def create_session(self, difficulty: str = 'hard', series: Optional[str] = None,
+                       players: int = 1) -> GameSession:
+        if not 1 <= players <= MAX_PLAYERS:
+            raise SessionError(f"A game has 1 to {MAX_PLAYERS} players")
+        board = self._board(difficulty, series)
+        secrets_ = tuple(self._rng.randrange(board.size) for _ in range(players))
+        session_id = secrets.token_urlsafe(9)
+        session = GameSession(session_id, board, secrets_, self._now())
+        self.sessions[session_id] = session
+        self.manager.metrics.increment('sessions.created', difficulty=difficulty)
+        return session
+
+    def session(self, session_id: str) -> GameSession:
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise SessionError(f"Unknown session {session_id!r}")
+        session.last_active = self._now()
+        return session
+
+    def close_session(self, session_id: str) -> bool:
+        return self.sessions.pop(session_id, None) is not None
+
+    def expire_idle(self, idle_seconds: Optional[float] = None) -> int:
+        """Drop the games untouched for `idle_seconds` and return how many"""
+        deadline = self._now() - (self.idle_seconds if idle_seconds is None else idle_seconds)
+        expired = [sid for sid, session in self.sessions.items() if session.last_active < deadline]
+        for session_id in expired:
+            del self.sessions[session_id]
+        if expired:
+            self.manager.metrics.increment('sessions.expired', len(expired))
+        return len(expired)
+
+    def board_payload(self, board: Board) -> Dict[str, Any]:
+        """Characters and questions of a board as sent to clients, cached per board"""
+        payload = self._board_payloads.get(board)
+        if payload is None:
+            payload = {
+                'characters': [{'position': position, 'series': c.series, 'id': c.id, 'name': c.name}
+                               for position, c in enumerate(board.characters)],
+                'questions': [[q.field, q.value, q.op] for q in board.questions],
+            }
+            self._board_payloads[board] = payload
+        return payload
+
+    # -- moves -------------------------------------------------------------
+
+    @staticmethod
+    def _now() -> float:
+        try:
+            return asyncio.get_running_loop().time()
+        except RuntimeError:
+            return 0.0
+
+    def _enqueue(self, kind: int, session: GameSession, player: int, argument: Any) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((kind, session, player, argument, future))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            loop.call_soon(self._flush)
+        return future
+
+    async def ask(self, session_id: str, player: int, field: str, value: Any, op: str = '=') -> bool:
+        """Ask a yes/no question about the character the player is looking for.
+
+        Any field and value may be asked, not only the board's `questions`:
+        the answer comes from the characters' values (see Board.answer_mask).
+        """
+        session = self.session(session_id)
+        return await self._enqueue(_ASK, session, player, session.board.question(field, value, op))
+
+    async def guess(self, session_id: str, player: int, position: int) -> bool:
+        """Guess the character at a board position; ends the game"""
+        return await self._enqueue(_GUESS, self.session(session_id), player, position)
+
+    def _flush(self):
+        """Answer every move queued during the last tick, in arrival order"""
+        pending, self._pending = self._pending, []
+        self._flush_scheduled = False
+        metrics = self.manager.metrics
+        start = perf_counter() if metrics.enabled else 0.0
+        masks: Dict[Tuple[Board, Question], int] = {}
+        for kind, session, player, argument, future in pending:
+            if future.done():
+                continue
+            try:
+                if kind == _ASK:
+                    round_state = session.round_for(player)
+                    key = (session.board, argument)
+                    mask = masks.get(key)
+                    if mask is None:
+                        mask = masks[key] = session.board.answer_mask(argument)
+                    result = round_state.ask_mask(mask)
+                    session.end_turn()
+                else:
+                    result = session.guess(player, argument)
+            except SessionError as e:
+                future.set_exception(e)
+            except Exception as e:
+                # One bad move must not leave the rest of the batch unanswered
+                logger.exception("Error answering a move of session %s", session.session_id)
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+        if metrics.enabled:
+            metrics.increment('sessions.moves', len(pending))
+            metrics.observe('sessions.flush_seconds', perf_counter() - start)
+
+    # -- housekeeping ------------------------------------------------------
+
+    def start(self, interval: float = SWEEP_INTERVAL):
+        """Expire idle games periodically on the running loop"""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep(interval))
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    async def _sweep(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            expired = self.expire_idle()
+            if expired:
+                logger.info("Expired %d idle games, %d left", expired, len(self.sessions))
+
+    # -- protocol ----------------------------------------------------------
+
+    async def handle(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one client message and build the response.
+
+        {"op": "create", "difficulty": "hard", "series": null, "players": 1}
+        {"op": "ask", "session": id, "player": 0, "field": "status", "value": "alive"}
+        {"op": "ask", "session": id, "player": 0, "field": "height", "value": 180, "compare": ">"}
+        {"op": "guess", "session": id, "player": 0, "position": 3}
+        {"op": "state", "session": id, "player": 0}
+        {"op": "close", "session": id}
+        """
+        try:
+            op = message.get('op')
+            player = int(message.get('player', 0))
+            if op == 'create':
+                session = self.create_session(message.get('difficulty', 'hard'), message.get('series'),
+                                              int(message.get('players', 1)))
+                return {'session': session.session_id, 'board': self.board_payload(session.board),
+                        'players': len(session.rounds)}
+            if op == 'ask':
+                if not isinstance(message['field'], str) or not isinstance(message['value'], (str, int, float)):
+                    raise ValueError("field must be a string and value a string or a number")
+                answer = await self.ask(message['session'], player, message['field'], message['value'],
+                                        message.get('compare', '='))
+                return {'answer': answer, **self.session(message['session']).state(player)}
+            if op == 'guess':
+                correct = await self.guess(message['session'], player, int(message['position']))
+                return {'correct': correct, **self.session(message['session']).state(player)}
+            if op == 'state':
+                return self.session(message['session']).state(player)
+            if op == 'close':
+                return {'closed': self.close_session(message['session'])}
+            raise SessionError(f"Unknown op {op!r}")
+        except SessionError as e:
+            return {'error': str(e)}
+        except (KeyError, TypeError, ValueError) as e:
+            return {'error': f"Bad request: {e!r}"}
+
+    async def _handle_http(self, request_line: bytes, reader: asyncio.StreamReader,
+                           writer: asyncio.StreamWriter):
+        length: Optional[int] = 0
+        while True:
+            header = await reader.readline()
+            if header in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = header.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                try:
+                    length = int(value.strip())
+                except ValueError:
+                    length = None
+        if not request_line.startswith(b'POST ') or length is None or not 0 <= length <= MAX_BODY_BYTES:
+            status, response = '400 Bad Request', {'error': "POST a JSON message of at most 64 KiB"}
+        else:
+            try:
+                response = await self.handle(json.loads(await reader.readexactly(length)))
+                status = '400 Bad Request' if 'error' in response else '200 OK'
+            except (ValueError, AttributeError, asyncio.IncompleteReadError) as e:
+                status, response = '400 Bad Request', {'error': f"Bad request: {e!r}"}
+        body = json.dumps(response, ensure_ascii=False).encode('utf-8')
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+
+    async def _handle_stream(self, line: bytes, reader: asyncio.StreamReader,
+                             writer: asyncio.StreamWriter):
+        while line:
+            if line.strip():
+                try:
+                    response = await self.handle(json.loads(line))
+                except (ValueError, AttributeError) as e:
+                    response = {'error': f"Bad request: {e!r}"}
+                writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                await writer.drain()
+            line = await reader.readline()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one HTTP request or a stream of JSON lines"""
+        try:
+            first = await reader.readline()
+            if first.split(b' ', 1)[0] in (b'GET', b'POST', b'PUT', b'DELETE', b'HEAD', b'OPTIONS'):
+                await self._handle_http(first, reader, writer)
+            else:
+                await self._handle_stream(first, reader, writer)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765):
+        """Run the server until cancelled"""
+        self.start()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        logger.info("Serving Guess Who games on %s:%d", host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Guess Who games over HTTP and JSON lines")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(GameService().serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import heapq
+from functools import lru_cache
+from math import log2
+from typing import List, Optional, Sequence, Tuple
+
+from characterModels import Character
+from gameBoard import Board, Question
+
+
+@lru_cache(maxsize=None)
+def split_entropy(yes: int, total: int) -> float:
+    """Expected information gain (bits) of a yes/no split over uniform candidates"""
+    if yes <= 0 or yes >= total:
+        return 0.0
+    p = yes / total
+    return -(p * log2(p) + (1 - p) * log2(1 - p))
+
+
+def rank_questions(board: Board, candidates: Optional[int] = None,
+                   k: int = 5) -> List[Tuple[Question, float]]:
+    """Return the k questions with the highest information gain for the candidates.
+
+    Each question costs one AND and one popcount against its precomputed answer
+    mask; questions that do not split the candidates are dropped.
+    """
+    if candidates is None:
+        candidates = board.full_mask
+    total = candidates.bit_count()
+    if total < 2:
+        return []
+
+    scored = []
+    for order, question in enumerate(board.questions):
+        yes = (candidates & board.answer_mask(question)).bit_count()
+        if 0 < yes < total:
+            # The order keeps ties deterministic (first question on the board wins)
+            scored.append((split_entropy(yes, total), -order, question))
+
+    return [(question, gain) for gain, _, question in heapq.nlargest(k, scored)]
+
+
+def best_question(board: Board, candidates: Optional[int] = None) -> Optional[Question]:
+    """The single most informative question, or None if the candidates can't be split"""
+    ranked = rank_questions(board, candidates, k=1)
+    return ranked[0][0] if ranked else None
+
+
+def suggest_questions(characters: Sequence[Character], k: int = 5) -> List[Tuple[Question, float]]:
+    """Rank questions for a plain list of candidates, e.g. a `filter_characters` result"""
+    return rank_questions(Board(characters), k=k)
@@ -0,0 +1,213 @@
+"""AI-vs-AI self-play to tune the questioning strategy and guessing threshold.
+
+Usage: python character/selfPlay.py [--games N] [--series S,...] [--difficulties D,...]
+                                    [--a STRATEGY] [--b STRATEGY] [--workers N] [--seed N]
+                                    [--output results.json]
+
+A strategy is "entropy", "random" or "topK" (pick at random among the K most
+informative questions), optionally followed by ":T" to guess as soon as at
+most T candidates remain, e.g. "entropy:2" or "top3:1".
+"""
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from characterIndex import iter_positions
+from characterModels import Character
+from gameBoard import DIFFICULTY_SIZES, Board
+from questionSelector import rank_questions
+
+# Games played by one pool task, and boards drawn for them
+CHUNK_GAMES = 20000
+CHUNK_BOARDS = 200
+
+
+@dataclass(frozen=True)
+class Strategy:
+    """How an AI player picks questions and when it guesses"""
+    question: str = 'entropy'   # 'entropy', 'random' or 'top'
+    top_k: int = 1              # questions drawn from when question == 'top'
+    guess_threshold: int = 1    # guess once at most this many candidates remain
+
+    @classmethod
+    def parse(cls, spec: str) -> 'Strategy':
+        name, _, threshold = spec.partition(':')
+        guess_threshold = int(threshold) if threshold else 1
+        if name == 'entropy' or name == 'random':
+            return cls(name, 1, guess_threshold)
+        if name.startswith('top') and name[3:].isdigit():
+            return cls('top', int(name[3:]), guess_threshold)
+        raise ValueError(f"Unknown strategy {spec!r}")
+
+    def __str__(self):
+        name = f"top{self.top_k}" if self.question == 'top' else self.question
+        return f"{name}:{self.guess_threshold}"
+
+
+class _Choices:
+    """Answer masks of the questions a strategy may ask, memoized per candidate set.
+
+    Deterministic strategies follow at most `board.size` paths through a
+    board, so after the first few games every turn is a dict lookup.
+    """
+
+    __slots__ = ('board', 'strategy', '_cache')
+
+    def __init__(self, board: Board, strategy: Strategy):
+        self.board = board
+        self.strategy = strategy
+        self._cache: Dict[int, Tuple[int, ...]] = {}
+
+    def __call__(self, candidates: int) -> Tuple[int, ...]:
+        masks = self._cache.get(candidates)
+        if masks is None:
+            board = self.board
+            k = {'entropy': 1, 'top': self.strategy.top_k}.get(self.strategy.question, len(board.questions))
+            masks = tuple(board.answer_mask(question) for question, _ in rank_questions(board, candidates, k))
+            self._cache[candidates] = masks
+        return masks
+
+
+def play_game(choices: Sequence[_Choices], rng: random.Random, first: int = 0) -> Tuple[int, int]:
+    """Play one game between two players on the same board.
+
+    Player i looks for the opponent's secret; a correct guess wins and a wrong
+    one loses. Returns the winner and the number of questions it asked.
+    """
+    board = choices[0].board
+    targets = (rng.randrange(board.size), rng.randrange(board.size))
+    candidates = [board.full_mask, board.full_mask]
+    asked = [0, 0]
+    player = first
+    while True:
+        current = candidates[player]
+        remaining = current.bit_count()
+        masks = choices[player](current) if remaining > choices[player].strategy.guess_threshold else ()
+        if not masks:
+            guess = list(iter_positions(current))[rng.randrange(remaining)] if remaining > 1 else \
+                current.bit_length() - 1
+            winner = player if guess == targets[player] else 1 - player
+            return winner, asked[winner]
+        mask = masks[0] if len(masks) == 1 else rng.choice(masks)
+        candidates[player] = current & mask if mask >> targets[player] & 1 else current & ~mask
+        asked[player] += 1
+        player = 1 - player
+
+
+_worker_characters: Dict[str, Tuple[Character, ...]] = {}
+
+
+def _init_worker(characters: Dict[str, Tuple[Character, ...]]):
+    _worker_characters.update(characters)
+
+
+def _play_chunk(series: str, difficulty: str, strategies: Tuple[Strategy, Strategy],
+                seed: str, games: int, boards: int) -> Dict[str, int]:
+    """Play `games` games over `boards` random boards; seeded by the chunk, not the worker"""
+    rng = random.Random(seed)
+    characters = _worker_characters[series]
+    result = {'games': 0, 'wins_a': 0, 'first_player_wins': 0, 'questions_a': 0, 'questions_b': 0}
+    for board_number in range(boards):
+        board = Board.random(characters, difficulty, rng)
+        choices = (_Choices(board, strategies[0]), _Choices(board, strategies[1]))
+        swapped = (choices[1], choices[0])
+        for game in range(games * (board_number + 1) // boards - games * board_number // boards):
+            # Alternate who starts and play from A's point of view
+            a_first = game % 2 == 0
+            winner, questions = play_game(choices if a_first else swapped, rng)
+            a_won = winner == (0 if a_first else 1)
+            result['games'] += 1
+            result['first_player_wins'] += winner == 0
+            result['wins_a'] += a_won
+            result['questions_a' if a_won else 'questions_b'] += questions
+    return result
+
+
+def simulate(series_characters: Dict[str, Sequence[Character]], difficulties: Sequence[str],
+             strategies: Tuple[Strategy, Strategy], games: int, seed: int = 0,
+             max_workers: Optional[int] = None, chunk_games: int = CHUNK_GAMES,
+             chunk_boards: int = CHUNK_BOARDS) -> List[Dict]:
+    """Play `games` games per (series, difficulty) in a process pool.
+
+    Work is cut into chunks seeded from (seed, series, difficulty, chunk), so
+    the results are the same for any number of workers.
+    """
+    plans = [(series, difficulty) for series in series_characters for difficulty in difficulties
+             if len(series_characters[series]) >= DIFFICULTY_SIZES[difficulty]]
+    characters = {series: tuple(chars) for series, chars in series_characters.items()}
+    reports = []
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(characters,)) as pool:
+        for series, difficulty in plans:
+            start = time.perf_counter()
+            futures = []
+            for chunk, chunk_start in enumerate(range(0, games, chunk_games)):
+                chunk_size = min(chunk_games, games - chunk_start)
+                boards = max(1, chunk_boards * chunk_size // chunk_games)
+                futures.append(pool.submit(_play_chunk, series, difficulty, strategies,
+                                           f"{seed}:{series}:{difficulty}:{chunk}", chunk_size, boards))
+            totals: Dict[str, int] = {}
+            for future in futures:
+                for key, value in future.result().items():
+                    totals[key] = totals.get(key, 0) + value
+            elapsed = time.perf_counter() - start
+            played, wins_a = totals['games'], totals['wins_a']
+            reports.append({
+                'series': series,
+                'difficulty': difficulty,
+                'board_size': DIFFICULTY_SIZES[difficulty],
+                'strategy_a': str(strategies[0]),
+                'strategy_b': str(strategies[1]),
+                'games': played,
+                'win_rate_a': wins_a / played,
+                'first_player_win_rate': totals['first_player_wins'] / played,
+                'questions_to_win_a': totals['questions_a'] / wins_a if wins_a else None,
+                'questions_to_win_b': totals['questions_b'] / (played - wins_a) if played > wins_a else None,
+                'seconds': elapsed,
+                'games_per_second': played / elapsed,
+            })
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI-vs-AI Guess Who self-play")
+    parser.add_argument('--games', type=int, default=100000, help="games per series and difficulty")
+    parser.add_argument('--series', help="comma separated series (default: all)")
+    parser.add_argument('--difficulties', default=','.join(DIFFICULTY_SIZES))
+    parser.add_argument('--a', default='entropy:1', help="strategy of player A")
+    parser.add_argument('--b', default='entropy:1', help="strategy of player B")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    from characterManager import CharacterManager
+    manager = CharacterManager()
+    series_names = args.series.split(',') if args.series else manager.get_available_series()
+    series_characters = {series: manager.get_characters_by_series(series) for series in series_names}
+    difficulties = args.difficulties.split(',')
+    strategies = (Strategy.parse(args.a), Strategy.parse(args.b))
+
+    reports = simulate(series_characters, difficulties, strategies, args.games, args.seed, args.workers)
+    print(f"{'series':<15}{'difficulty':<11}{'games':>10}{'A wins':>9}{'1st wins':>10}"
+          f"{'A q/win':>9}{'B q/win':>9}{'games/s':>11}")
+    for r in reports:
+        print(f"{r['series']:<15}{r['difficulty']:<11}{r['games']:>10}{r['win_rate_a']:>9.3f}"
+              f"{r['first_player_win_rate']:>10.3f}{r['questions_to_win_a'] or 0:>9.2f}"
+              f"{r['questions_to_win_b'] or 0:>9.2f}{r['games_per_second']:>11.0f}")
+    skipped = [(s, d) for s in series_names for d in difficulties
+               if len(series_characters[s]) < DIFFICULTY_SIZES[d]]
+    for series, difficulty in skipped:
+        print(f"Skipped {series} {difficulty}: not enough characters")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'strategies': [asdict(s) for s in strategies], 'seed': args.seed,
+                       'results': reports}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Readers running on many threads while the manager publishes new data.
+
+Every read must see one complete published CharacterData: a series is
+either entirely in its previous version or entirely in the new one, and
+never missing or partially indexed.
+"""
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'character'))
+
+from characterManager import CharacterManager  # noqa: E402
+
+SERIES = ('onepiece', 'naruto', 'demonslayer', 'attackontitan')
+CHARACTERS_PER_SERIES = 300
+READERS = 4
+RELOADS = 10
+
+
+def write_series(data_dir, series: str, version: int, count: int = CHARACTERS_PER_SERIES):
+    """Series file whose characters all carry the version in their status"""
+    body = [{'id': i, 'name': f"{series} character {i}", 'status': f"v{version}"} for i in range(count)]
+    with open(os.path.join(data_dir, f"{series}.json"), 'w', encoding='utf-8') as f:
+        json.dump({'status': 200, 'body': body}, f)
+
+
+def make_manager(data_dir, lazy: bool) -> CharacterManager:
+    class TestManager(CharacterManager):
+        _instance = None
+        DATA_DIR = str(data_dir)
+        SERIES_FILES = [f"{series}.json" for series in SERIES]
+        use_snapshots = False
+        lazy_loading = lazy
+
+    return TestManager()
+
+
+def run_readers(read, stop: threading.Event, errors: list) -> list:
+    def loop():
+        try:
+            while not stop.is_set():
+                read()
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [threading.Thread(target=loop) for _ in range(READERS)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def check_versions(characters, count: int):
+    """All the characters of a series, in a single version"""
+    assert len(characters) == count
+    assert len({character.status for character in characters}) == 1
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    for series in SERIES:
+        write_series(tmp_path, series, 0)
+    return tmp_path
+
+
+def test_readers_never_see_a_partial_reload(data_dir):
+    manager = make_manager(data_dir, lazy=False)
+    total = CHARACTERS_PER_SERIES * len(SERIES)
+
+    def read():
+        characters = manager.get_characters_by_series('naruto')
+        check_versions(characters, CHARACTERS_PER_SERIES)
+        version = characters[0].status
+        # Each call works on one published data: whichever version it saw,
+        # the index and the search agree with the characters
+        matches = manager.filter_characters(series='naruto', status=version)
+        assert len(matches) in (0, CHARACTERS_PER_SERIES)
+        found = manager.filter_characters(series='naruto')
+        check_versions(found, CHARACTERS_PER_SERIES)
+        assert len(manager.get_all_characters()) == total
+        assert manager.get_character_count_by_series()['naruto'] == CHARACTERS_PER_SERIES
+        assert len(manager.search_characters('naruto character')) == CHARACTERS_PER_SERIES
+        character = manager.get_character_by_id(7, series='naruto')
+        assert character is not None and character.name == 'naruto character 7'
+
+    stop, errors = threading.Event(), []
+    threads = run_readers(read, stop, errors)
+    try:
+        for version in range(1, RELOADS + 1):
+            if stop.is_set():
+                break
+            write_series(data_dir, 'naruto', version)
+            # Make sure the signature changes even on coarse mtime clocks
+            os.utime(os.path.join(data_dir, 'naruto.json'), ns=(version * 10 ** 9, version * 10 ** 9))
+            assert manager.reload_changed() == ['naruto']
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    assert not errors, errors[0]
+    check_versions(manager.get_characters_by_series('naruto'), CHARACTERS_PER_SERIES)
+    assert manager.get_characters_by_series('naruto')[0].status == f"v{RELOADS}"
+
+
+def test_readers_never_see_a_partial_lazy_load(data_dir):
+    manager = make_manager(data_dir, lazy=True)
+    barrier = threading.Barrier(READERS)
+    errors = []
+
+    def read(reader: int):
+        try:
+            barrier.wait()
+            # Readers start on different series so that several loads race
+            for i in range(len(SERIES)):
+                series = SERIES[(reader + i) % len(SERIES)]
+                check_versions(manager.get_characters_by_series(series), CHARACTERS_PER_SERIES)
+                assert len(manager.filter_characters(series=series)) == CHARACTERS_PER_SERIES
+            assert len(manager.get_all_characters()) == CHARACTERS_PER_SERIES * len(SERIES)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read, args=(reader,)) for reader in range(READERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors, errors[0]
@@ -0,0 +1,50 @@
+"""Streaming JSON decoding across chunk boundaries.
+
+The series files are read a chunk at a time, so a value may be cut anywhere
+by the end of a chunk; every cut must decode to the same members as
+json.loads.
+"""
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'character'))
+
+from characterLoader import iter_json_members  # noqa: E402
+
+DOCUMENT = ('{"status": 200, "version": 1.25, "body": ['
+            '{"id": 12, "age": 19.5, "weight": -6.02e-3, "height": 1E+2, "alive": true, "rank": null}, '
+            '{"id": 3, "name": "Levi", "kills": [58, 0.5, 2e10]}], "total": 2.5e1}')
+
+
+class SplitReader(io.StringIO):
+    """Text file that returns its content in two reads, cut at `split`"""
+
+    def __init__(self, text: str, split: int):
+        super().__init__(text)
+        self._cuts = [split]
+
+    def read(self, size: int = -1) -> str:
+        if self._cuts:
+            return super().read(self._cuts.pop() - self.tell())
+        return super().read(size)
+
+
+def decode(f) -> dict:
+    return {key: list(value) if key == 'body' else value for key, value in iter_json_members(f)}
+
+
+@pytest.mark.parametrize('split', range(1, len(DOCUMENT)))
+def test_members_are_the_same_wherever_the_chunk_ends(split):
+    assert decode(SplitReader(DOCUMENT, split)) == json.loads(DOCUMENT)
+
+
+@pytest.mark.parametrize('number', ['12.5', '1e5', '1e-5', '-0.25E+3', '7'])
+def test_number_cut_after_its_integer_part(number):
+    document = f'{{"body": [{number}, {number}]}}'
+    expected = json.loads(document)
+    for split in range(1, len(document)):
+        assert decode(SplitReader(document, split)) == expected
@@ -1,60 +1,429 @@
+"""Format and validate character JSON files.
+
+Usage:
+    python utils/formatJSON.py                          interactive, one file
+    python utils/formatJSON.py input.json [[-o] output.json]  format one file
+    python utils/formatJSON.py DIR_OR_FILE... [--check] [--workers N] [--series NAME] [--no-cache]
+
+Directories are searched for .json and .jsonl files, which are formatted and
+validated in a process pool. Series files are checked against the fields
+CharacterFactory reads (missing or duplicate ids, unknown fields, wrong
+types). Files whose content hash matches the last successful run are skipped,
+and files are only rewritten, atomically, when their formatting changes.
+With --check nothing is written and the exit status is 1 if any file would be
+reformatted or has errors.
+"""
+import argparse
+import hashlib
 import json
 import os
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from types import GeneratorType
+from typing import Union, get_args, get_origin, get_type_hints
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'character'))
+
+from characterFactory import CharacterFactory
+from characterLoader import iter_json_members
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEFAULT_FILE = os.path.join(ROOT, 'practica4', 'assets', 'data', 'attackontitan.json')
+CACHE_FILE = '.formatjson_cache.json'
+# Bump when the output format or the validation rules change
+FORMAT_VERSION = 1
+
+_schemas = {}
+
+
+def _digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_mode(path):
+    """Permissions to give a replacement of path: its own, or the umask default"""
+    try:
+        return os.stat(path).st_mode & 0o777
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def _json_types(annotation):
+    """Python types a JSON value may decode to for a model annotation, and list item types"""
+    origin = get_origin(annotation)
+    if origin is Union:
+        types, items = (), ()
+        for arg in get_args(annotation):
+            arg_types, arg_items = _json_types(arg)
+            types, items = types + arg_types, items + arg_items
+        return types, items
+    if annotation is type(None):
+        return (type(None),), ()
+    if origin is list or annotation is list:
+        args = get_args(annotation)
+        return (list,), (_json_types(args[0])[0] if args else (object,))
+    if origin is dict or annotation is dict:
+        return (dict,), ()
+    if annotation is float:
+        return (int, float), ()
+    if annotation in (int, str, bool):
+        return (annotation,), ()
+    return (object,), ()
+
+
+def _schema(series):
+    """{JSON key: (model attribute, allowed types, allowed list item types)} of a series"""
+    schema = _schemas.get(series)
+    if schema is None:
+        model, json_fields = CharacterFactory.schema(series)
+        hints = get_type_hints(model)
+        schema = _schemas[series] = {key: (name,) + _json_types(hints[name]) for key, name in json_fields.items()}
+    return schema
+
+
+def _matches(value, types):
+    if type(value) is bool and bool not in types:
+        return False
+    return object in types or isinstance(value, types)
+
+
+def _type_names(types):
+    return ' or '.join(sorted({'null' if t is type(None) else t.__name__ for t in types}))
+
+
+class EntryValidator:
+    """Checks the character entries of one series file as they stream past"""
+
+    def __init__(self, series):
+        self.schema = _schema(series)
+        self.problems = []
+        self._ids = {}
+
+    def error(self, number, entry, message):
+        name = entry.get('name') if isinstance(entry, dict) else None
+        label = f"entry {number}" + (f" ({name})" if isinstance(name, str) else '')
+        self.problems.append(('error', f"{label}: {message}"))
+
+    def check(self, number, entry):
+        if entry is None:
+            self.problems.append(('warning', f"entry {number}: null entry is skipped when loading"))
+            return
+        if not isinstance(entry, dict):
+            self.error(number, entry, f"expected an object, got {type(entry).__name__}")
+            return
+        for required in ('id', 'name'):
+            if entry.get(required) is None:
+                self.error(number, entry, f"missing {required}")
+        char_id = entry.get('id')
+        if char_id is not None and isinstance(char_id, (int, str)):
+            if char_id in self._ids:
+                self.error(number, entry, f"duplicate id {char_id!r} (first used by entry {self._ids[char_id]})")
+            else:
+                self._ids[char_id] = number
+        for key, value in entry.items():
+            spec = self.schema.get(key)
+            if spec is None:
+                self.error(number, entry, f"unknown field {key!r}")
+                continue
+            _, types, item_types = spec
+            if value is None:
+                continue
+            if not _matches(value, types):
+                self.error(number, entry, f"{key} should be {_type_names(types)}, got {type(value).__name__}")
+            elif isinstance(value, list) and item_types:
+                wrong = [item for item in value if not _matches(item, item_types)]
+                if wrong:
+                    self.error(number, entry, f"{key} items should be {_type_names(item_types)}, "
+                                              f"got {type(wrong[0]).__name__}")
+
+
+class _Output:
+    """Text sink hashing what is written, and writing it to a file unless checking"""
+
+    def __init__(self, f=None):
+        self._file = f
+        self.digest = hashlib.sha256()
+
+    def write(self, text):
+        self.digest.update(text.encode('utf-8'))
+        if self._file is not None:
+            self._file.write(text)
+
+
+def _dumps(value, indent=''):
+    """json.dump(indent=2) output for a value nested at the given indentation"""
+    text = json.dumps(value, indent=2, ensure_ascii=False, separators=(',', ': '))
+    return text.replace('\n', '\n' + indent) if indent else text
+
+
+def _format_series_json(f, out, validator):
+    """Stream a {"status": ..., "body": [...]} style object, one body entry at a time"""
+    first_member = True
+    for key, value in iter_json_members(f):
+        out.write('{\n  ' if first_member else ',\n  ')
+        first_member = False
+        out.write(json.dumps(key, ensure_ascii=False) + ': ')
+        if isinstance(value, GeneratorType):
+            empty = True
+            for number, entry in enumerate(value):
+                out.write('[\n    ' if empty else ',\n    ')
+                empty = False
+                if validator is not None and key == 'body':
+                    validator.check(number, entry)
+                out.write(_dumps(entry, '    '))
+            out.write('[]' if empty else '\n  ]')
+        else:
+            out.write(_dumps(value, '  '))
+    out.write('{}' if first_member else '\n}')
+
+
+def _format_json_lines(f, out, validator):
+    for number, line in enumerate(line for line in f if line.strip()):
+        entry = json.loads(line)
+        if validator is not None:
+            validator.check(number, entry)
+        out.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def _format(input_file_path, out, validator):
+    with open(input_file_path, 'r', encoding='utf-8') as f:
+        if input_file_path.endswith('.jsonl'):
+            _format_json_lines(f, out, validator)
+            return
+        start = f.read(4096).lstrip()
+        f.seek(0)
+        if start.startswith('{'):
+            _format_series_json(f, out, validator)
+        else:
+            out.write(_dumps(json.load(f)))
+
+
+def series_of(path):
+    """Series a data file belongs to, from its name (onepiece.json -> onepiece)"""
+    name = os.path.basename(path).split('.')[0].lower()
+    return name if name in CharacterFactory.registered_series() else None
+
+
+def process_file(input_file_path, output_file_path=None, series=None, check=False, known_digest=None):
+    """Format and validate one file.
+
+    Args:
+        input_file_path (str): Path to the input JSON or JSON Lines file
+        output_file_path (str): Path to the output file (optional, defaults to input file)
+        series (str): Series to validate against (optional, guessed from the file name)
+        check (bool): Only report, never write
+        known_digest (str): Hash of the input after the last successful run, to skip it
+
+    Returns:
+        dict: path, status ('skipped', 'unchanged', 'formatted', 'would format' or
+        'error'), problems as (level, message) pairs and the hash of the result
+    """
+    result = {'path': input_file_path, 'status': 'error', 'problems': [], 'digest': None}
+    in_place = output_file_path is None or os.path.abspath(output_file_path) == os.path.abspath(input_file_path)
+    output_file_path = input_file_path if in_place else output_file_path
+    try:
+        input_digest = _digest(input_file_path)
+        if in_place and known_digest == input_digest:
+            result.update(status='skipped', digest=input_digest)
+            return result
+        series = series or series_of(input_file_path)
+        validator = EntryValidator(series) if series else None
+
+        if check:
+            out = _Output()
+            _format(input_file_path, out, validator)
+            tmp_path = None
+        else:
+            directory = os.path.dirname(os.path.abspath(output_file_path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                os.chmod(tmp_path, _file_mode(output_file_path))
+                with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+                    out = _Output(f)
+                    _format(input_file_path, out, validator)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+        output_digest = out.digest.hexdigest()
+        changed = not in_place or output_digest != input_digest
+        if tmp_path is not None:
+            if changed:
+                os.replace(tmp_path, output_file_path)
+            else:
+                os.unlink(tmp_path)
+        if changed:
+            status = 'would format' if check else 'formatted'
+        else:
+            status = 'unchanged'
+        if validator is not None:
+            result['problems'] = validator.problems
+        result.update(status=status, digest=output_digest)
+    except FileNotFoundError:
+        result['problems'] = [('error', "file not found")]
+    except (json.JSONDecodeError, ValueError) as e:
+        result['problems'] = [('error', f"invalid JSON: {e}")]
+    except Exception as e:
+        result['problems'] = [('error', str(e))]
+    return result
+
 
 def format_json_file(input_file_path, output_file_path=None):
     """
     Format a JSON file to make it more human-readable.
-    
+
     Args:
         input_file_path (str): Path to the input JSON file
         output_file_path (str): Path to the output file (optional, defaults to input file)
     """
+    result = process_file(input_file_path, output_file_path)
+    for level, message in result['problems']:
+        print(f"{level.capitalize()}: {input_file_path}: {message}")
+    if result['status'] == 'formatted':
+        print(f"Successfully formatted JSON file: {output_file_path or input_file_path}")
+    elif result['status'] == 'unchanged':
+        print(f"Already formatted: {input_file_path}")
+    return result
+
+
+def is_data_file(path):
+    """Whether a file name is one of the data files formatted in batch"""
+    name = os.path.basename(path)
+    return name.endswith(('.json', '.jsonl')) and not name.startswith('.')
+
+
+def find_data_files(paths):
+    """The .json and .jsonl files of the given files and directories, sorted"""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, dirnames, filenames in os.walk(path):
+                dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+                found += [os.path.join(directory, name) for name in filenames if is_data_file(name)]
+        else:
+            found.append(path)
+    return sorted(set(found))
+
+
+def _cache_fingerprint():
+    schema = {series: sorted(CharacterFactory.schema(series)[1].items())
+              for series in sorted(CharacterFactory.registered_series())}
+    return hashlib.sha256(json.dumps([FORMAT_VERSION, schema]).encode('utf-8')).hexdigest()
+
+
+def _load_cache(path):
     try:
-        # Read the JSON file
-        with open(input_file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-        
-        # If no output path specified, overwrite the input file
-        if output_file_path is None:
-            output_file_path = input_file_path
-        
-        # Write the formatted JSON back to file
-        with open(output_file_path, 'w', encoding='utf-8') as file:
-            json.dump(data, file, indent=2, ensure_ascii=False, separators=(',', ': '))
-        
-        print(f"Successfully formatted JSON file: {output_file_path}")
-        
-    except FileNotFoundError:
-        print(f"Error: File '{input_file_path}' not found.")
-    except json.JSONDecodeError as e:
-        print(f"Error: Invalid JSON format in '{input_file_path}': {e}")
-    except Exception as e:
-        print(f"Error: {e}")
+        with open(path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if cache.get('fingerprint') == _cache_fingerprint():
+            return cache['files']
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+    return {}
+
+
+def _save_cache(path, files):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump({'fingerprint': _cache_fingerprint(), 'files': files}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def process_files(paths, check=False, workers=None, series=None, cache_path=CACHE_FILE):
+    """Format and validate every data file under the paths in a process pool.
+
+    Returns the per-file results (see process_file) in path order.
+    """
+    files = find_data_files(paths)
+    cache = _load_cache(cache_path) if cache_path else {}
+    keys = [os.path.abspath(path) for path in files]
+    jobs = [(path, None, series, check, cache.get(key)) for path, key in zip(files, keys)]
+    if workers == 1 or len(jobs) < 2:
+        results = [process_file(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(process_file, *zip(*jobs), chunksize=max(1, len(jobs) // 64)))
+
+    if cache_path and not check:
+        for key, result in zip(keys, results):
+            if result['status'] == 'error' or any(level == 'error' for level, _ in result['problems']):
+                cache.pop(key, None)
+            else:
+                cache[key] = result['digest']
+        _save_cache(cache_path, cache)
+    return results
+
+
+def run_batch(args):
+    results = process_files(args.paths, args.check, args.workers, args.series,
+                            None if args.no_cache else args.cache)
+    counts = {}
+    failed = False
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+        if result['status'] in ('formatted', 'would format'):
+            print(f"{'Would format' if args.check else 'Formatted'} {result['path']}")
+        for level, message in result['problems']:
+            print(f"{level.capitalize()}: {result['path']}: {message}")
+            failed = failed or level == 'error'
+        failed = failed or result['status'] in ('error', 'would format')
+    print(', '.join(f"{count} {status}" for status, count in sorted(counts.items())) or "No files found")
+    return 1 if failed else 0
+
 
 def main():
     """Main function to handle command line arguments or interactive input."""
     if len(sys.argv) > 1:
+        parser = argparse.ArgumentParser(description="Format and validate character JSON files")
+        parser.add_argument('paths', nargs='+', help="files or directories")
+        parser.add_argument('--check', action='store_true', help="report only, exit with 1 on changes or errors")
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--series', help="validate every file against this series")
+        parser.add_argument('--cache', default=CACHE_FILE, help="hash cache used to skip unchanged files")
+        parser.add_argument('--no-cache', action='store_true')
+        parser.add_argument('-o', '--output', help="write the formatted single input file here")
+        args = parser.parse_args()
+        options = args.check or args.workers or args.series
+        if len(args.paths) == 2 and args.output is None and not options and os.path.isfile(args.paths[0]):
+            # input.json output.json: the second path is the output unless it
+            # is an existing data file, which could as well be a second input
+            second = args.paths[1]
+            if not os.path.exists(second) or (os.path.isfile(second) and not is_data_file(second)):
+                args.paths, args.output = args.paths[:1], second
+            elif os.path.isfile(second):
+                parser.error(f"{second} already exists: use -o {second} to overwrite it with the "
+                             f"formatted {args.paths[0]}, or --workers 1 to format both files")
+        batch = options or len(args.paths) > 1 or any(os.path.isdir(path) for path in args.paths)
+        if args.output is not None and batch:
+            parser.error("-o/--output takes a single input file and no batch options")
+        if batch:
+            sys.exit(run_batch(args))
         # Command line usage
-        input_file = sys.argv[1]
-        output_file = sys.argv[2] if len(sys.argv) > 2 else None
-        format_json_file(input_file, output_file)
+        format_json_file(args.paths[0], args.output)
     else:
         # Interactive usage
         print("JSON Formatter")
         print("=============")
-        
-        # Default to the Attack on Titan JSON file
-        default_file = r"c:\Users\Axela\OneDrive\Escritorio\GuessWho-\CharacterJSONs\attackontitan.json"
-        
+
+        # Default to the Attack on Titan JSON file shipped with the app
+        default_file = os.path.normpath(DEFAULT_FILE)
+
         input_file = input(f"Enter JSON file path (default: {default_file}): ").strip()
         if not input_file:
             input_file = default_file
-        
+
         if not os.path.exists(input_file):
             print(f"Error: File '{input_file}' not found.")
             return
-        
+
         # Ask if user wants to overwrite or create new file
         choice = input("Overwrite original file? (y/n, default: y): ").strip().lower()
         if choice == 'n':
@@ -64,7 +433,7 @@ def main():
                 return
         else:
             output_file = None
-        
+
         format_json_file(input_file, output_file)
 
 if __name__ == "__main__":